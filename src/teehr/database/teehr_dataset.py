@@ -1,7 +1,9 @@
 """Defines the TEEHR dataset class and pre-processing methods."""
-from typing import Union, List, Callable, Dict, Any
+from typing import Union, List, Callable, Dict, Any, Tuple
+from collections import OrderedDict
 from pathlib import Path
 import logging
+import os
 
 import re
 import duckdb
@@ -25,6 +27,25 @@ from teehr.models.queries import MetricEnum
 
 logger = logging.getLogger(__name__)
 
+UNIQUE_FIELD_VALUES_CACHE_SIZE = 64
+_unique_field_values_cache = OrderedDict()
+
+
+def _database_version(database_filepath: str) -> Tuple:
+    """Get the modification time and size of the database files.
+
+    The write-ahead log is included so that uncheckpointed writes also
+    invalidate cached results.
+    """
+    version = []
+    for filepath in (database_filepath, f"{database_filepath}.wal"):
+        try:
+            stat = os.stat(filepath)
+            version.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
 
 class TEEHRDatasetAPI:
     """Create an instance of a TEEHRDataset class for API-based queries and \
@@ -46,7 +67,7 @@ class TEEHRDatasetAPI:
         table as a pandas dataframe.
 
     describe_inputs(primary_filepath: Union[str, Path], \
-    secondary_filepath: Union[str, Path])
+    secondary_filepath: Union[str, Path], exact: bool = True)
         Get descriptive statistics on the primary and secondary
         timeseries by reading the parquet files as a pandas dataframe.
 
@@ -89,6 +110,7 @@ class TEEHRDatasetAPI:
         self,
         query: str,
         format: str = None,
+        params: List = None,
     ):
         """Run an SQL query against the class's database.
 
@@ -98,9 +120,11 @@ class TEEHRDatasetAPI:
         * Results bprinted to the screen (format='raw')
         * A DuckDBPyRelation, a symbolic representation of the SQL query
           (format='relation').
+
+        Query parameters (params) can be passed with format='df'.
         """
         if format == "df":
-            return self.con.sql(query).df()
+            return self.con.execute(query, params).df()
         elif format == "raw":
             return self.con.sql(query).show()
         elif format == "relation":
@@ -142,6 +166,7 @@ class TEEHRDatasetAPI:
     def describe_inputs(
         primary_filepath: Union[str, Path],
         secondary_filepath: Union[str, Path],
+        exact: bool = True,
     ) -> pd.DataFrame:
         """Get descriptive statistics on the primary and secondary
         timeseries by reading the parquet files.
@@ -152,6 +177,10 @@ class TEEHRDatasetAPI:
             Path to the primary time series parquet file.
         secondary_filepath : Union[str, Path]
             Path to the primary time series parquet file.
+        exact : bool, optional
+            Whether location IDs are counted exactly (True), or estimated
+            with approximate distinct counts (False), which uses less memory
+            for large datasets. By default True.
 
         Returns
         -------
@@ -168,13 +197,17 @@ class TEEHRDatasetAPI:
             * Number of location IDs with duplicate value times
             * Number of location IDs with missing time steps
         """
-        primary_dict = tqu_db.describe_timeseries(
-            timeseries_filepath=primary_filepath
-        )
+        # Share one in-memory connection between both descriptions
+        with duckdb.connect() as con:
+            primary_dict = tqu_db.describe_timeseries(
+                timeseries_filepath=primary_filepath, con=con, exact=exact
+            )
 
-        secondary_dict = tqu_db.describe_timeseries(
-            timeseries_filepath=secondary_filepath
-        )
+            secondary_dict = tqu_db.describe_timeseries(
+                timeseries_filepath=secondary_filepath,
+                con=con,
+                exact=exact
+            )
 
         df = pd.DataFrame(
             {
@@ -232,16 +265,18 @@ class TEEHRDatasetAPI:
 
         mq = self._validate_query_model(mq)
 
-        query = tqu_db.create_get_metrics_query(mq)
-
         if mq.return_query:
+            query = tqu_db.create_get_metrics_query(mq)
             return tqu.remove_empty_lines(query)
-        elif mq.include_geometry:
+
+        # Pass the filter values as query parameters
+        params = []
+        query = tqu_db.create_get_metrics_query(mq, params)
+        if mq.include_geometry:
             self._check_if_geometry_is_inserted()
-            df = self.query(query, format="df")
+            df = self.query(query, format="df", params=params)
             return tqu.df_to_gdf(df)
-        else:
-            df = self.query(query, format="df")
+        df = self.query(query, format="df", params=params)
         return df
 
     def get_joined_timeseries(
@@ -269,16 +304,18 @@ class TEEHRDatasetAPI:
 
         jtq = self._validate_query_model(jtq)
 
-        query = tqu_db.create_get_joined_timeseries_query(jtq)
-
         if jtq.return_query:
+            query = tqu_db.create_get_joined_timeseries_query(jtq)
             return tqu.remove_empty_lines(query)
-        elif jtq.include_geometry:
+
+        # Pass the filter values as query parameters
+        params = []
+        query = tqu_db.create_get_joined_timeseries_query(jtq, params)
+        if jtq.include_geometry:
             self._check_if_geometry_is_inserted()
-            df = self.query(query, format="df")
+            df = self.query(query, format="df", params=params)
             return tqu.df_to_gdf(df)
-        else:
-            df = self.query(query, format="df")
+        df = self.query(query, format="df", params=params)
         return df
 
     def get_timeseries(
@@ -305,12 +342,14 @@ class TEEHRDatasetAPI:
 
         tq = self._validate_query_model(tq)
 
-        query = tqu_db.create_get_timeseries_query(tq)
-
         if tq.return_query:
+            query = tqu_db.create_get_timeseries_query(tq)
             return tqu.remove_empty_lines(query)
-        else:
-            df = self.query(query, format="df")
+
+        # Pass the filter values as query parameters
+        params = []
+        query = tqu_db.create_get_timeseries_query(tq, params)
+        df = self.query(query, format="df", params=params)
         return df
 
     def get_timeseries_chars(
@@ -346,12 +385,14 @@ class TEEHRDatasetAPI:
 
         tcq = self._validate_query_model(tcq)
 
-        query = tqu_db.create_get_timeseries_char_query(tcq)
-
         if tcq.return_query:
+            query = tqu_db.create_get_timeseries_char_query(tcq)
             return tqu.remove_empty_lines(query)
-        else:
-            df = self.query(query, format="df")
+
+        # Pass the filter values as query parameters
+        params = []
+        query = tqu_db.create_get_timeseries_char_query(tcq, params)
+        df = self.query(query, format="df", params=params)
         return df
 
         pass
@@ -378,9 +419,34 @@ class TEEHRDatasetAPI:
             Create the get unique field values query.
         """
         fn = self._validate_query_model(fn)
-        query = tqu_db.create_unique_field_values_query(fn)
-        df = self.query(query, format="df")
-        return df
+        return self._get_cached_unique_field_values(fn)
+
+    def _get_cached_unique_field_values(
+        self,
+        fn: JoinedTimeseriesFieldName,
+        **query_kwargs
+    ) -> pd.DataFrame:
+        """Get unique field values, re-using results from earlier calls.
+
+        Results are cached by database filepath, database file version
+        and field name, so any write to the database invalidates them.
+        """
+        key = (
+            self.database_filepath,
+            _database_version(self.database_filepath),
+            fn.field_name
+        )
+        df = _unique_field_values_cache.get(key)
+        if df is None:
+            query = tqu_db.create_unique_field_values_query(fn)
+            df = self.query(query, format="df", **query_kwargs)
+            _unique_field_values_cache[key] = df
+            if len(_unique_field_values_cache) > \
+                    UNIQUE_FIELD_VALUES_CACHE_SIZE:
+                _unique_field_values_cache.popitem(last=False)
+        else:
+            _unique_field_values_cache.move_to_end(key)
+        return df.copy()
 
 
 class TEEHRDatasetDB(TEEHRDatasetAPI):
@@ -401,6 +467,7 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
             "primary_location_id", \
         ], \
         drop_added_fields=False, \
+        filters: Union[List[dict], None] = None, \
     )
         Joins the primary and secondary timeseries from parquet files
         and inserts into the database as the joined_timeseries table.
@@ -431,7 +498,8 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
 
     describe_inputs( \
         primary_filepath: Union[str, Path], \
-        secondary_filepath: Union[str, Path] \
+        secondary_filepath: Union[str, Path], \
+        exact: bool = True \
     ) -> pd.DataFrame
         Get descriptive statistics on the primary and secondary
         timeseries by reading the parquet files as a pandas dataframe.
@@ -494,15 +562,19 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
         query: str,
         read_only: bool = False,
         format: str = None,
-        create_function_args: Dict = None
+        create_function_args: Dict = None,
+        params: List = None,
     ):
-        """Run query against the class's database."""
+        """Run query against the class's database.
+
+        Query parameters (params) can be passed with format='df'.
+        """
         if not create_function_args:
             with duckdb.connect(
                 self.database_filepath, read_only=read_only
             ) as con:
                 if format == "df":
-                    return con.sql(query).df()
+                    return con.execute(query, params).df()
                 elif format == "raw":
                     return con.sql(query).show()
                 elif format == "relation":
@@ -529,6 +601,9 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
 
     def _initialize_database_tables(self):
         """Create the persistent study database and empty table(s)."""
+        # absolute_difference is computed when read from the stored FLOAT
+        #  values, so it can differ from the difference of the source
+        #  values in the last float digit (about 1e-5 relative).
         create_timeseries_table = """
             CREATE TABLE IF NOT EXISTS joined_timeseries(
                 reference_time DATETIME,
@@ -541,7 +616,9 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
                 primary_value FLOAT,
                 primary_location_id VARCHAR,
                 lead_time INTERVAL,
-                absolute_difference FLOAT
+                absolute_difference FLOAT GENERATED ALWAYS AS (
+                    abs(primary_value - secondary_value)
+                ) VIRTUAL
                 );"""
 
         self.query(create_timeseries_table)
@@ -555,6 +632,22 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
                 );"""
         self.query(create_geometry_table)
 
+    def _absolute_difference_is_generated(self) -> bool:
+        """Check whether absolute_difference is a generated column.
+
+        Databases created by earlier versions store the field.
+        """
+        query = """
+            SELECT
+                sql
+            FROM
+                duckdb_tables()
+            WHERE
+                table_name = 'joined_timeseries'
+        ;"""
+        df = self.query(query, read_only=True, format="df")
+        return bool(df.size) and "GENERATED" in df.sql[0].upper()
+
     def _drop_joined_timeseries_field(self, field_name: str):
         """Drop the specified field by name from joined_timeseries table."""
         query = f"""
@@ -627,6 +720,7 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
             "value_time"
         ],
         drop_added_fields=False,
+        filters: Union[List[dict], None] = None,
     ):
         """Join the primary and secondary timeseries read from parquet files
         and inserts into the database as the joined_timeseries table.
@@ -650,6 +744,12 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
             A flag to determine whether to drop any user-defined fields that
             have been added to the table (True), or raise an error if added
             fields exist (False). By default False.
+        filters : Union[List[dict], None], optional
+            List of dictionaries describing the "where" clause to limit the
+            joined timeseries that are inserted. Filters on the reference_time,
+            value_time, configuration, measurement_unit, variable_name and
+            primary_location_id fields are applied while reading the files.
+            By default None.
 
         See Also
         --------
@@ -664,10 +764,16 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
                 "secondary_filepath": secondary_filepath,
                 "crosswalk_filepath": crosswalk_filepath,
                 "order_by": order_by,
+                "filters": filters,
             }
         )
 
-        query = tqu_db.create_join_and_save_timeseries_query(jtq)
+        query = tqu_db.create_join_and_save_timeseries_query(
+            jtq,
+            store_absolute_difference=(
+                not self._absolute_difference_is_generated()
+            )
+        )
         self.query(query)
 
     def _get_unique_attributes(self, attributes_filepath: str) -> List:
@@ -894,16 +1000,20 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
         }
         mq = self._validate_query_model(MetricQuery, data)
 
-        query = tqu_db.create_get_metrics_query(mq)
-
         if mq.return_query:
+            query = tqu_db.create_get_metrics_query(mq)
             return tqu.remove_empty_lines(query)
-        elif mq.include_geometry:
+
+        # Pass the filter values as query parameters
+        params = []
+        query = tqu_db.create_get_metrics_query(mq, params)
+        if mq.include_geometry:
             self._check_if_geometry_is_inserted()
-            df = self.query(query, read_only=True, format="df")
+            df = self.query(
+                query, read_only=True, format="df", params=params
+            )
             return tqu.df_to_gdf(df)
-        else:
-            df = self.query(query, read_only=True, format="df")
+        df = self.query(query, read_only=True, format="df", params=params)
         return df
 
     def get_joined_timeseries(
@@ -950,16 +1060,18 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
         }
         jtq = self._validate_query_model(JoinedTimeseriesQuery, data)
 
-        query = tqu_db.create_get_joined_timeseries_query(jtq)
-
         if jtq.return_query:
+            query = tqu_db.create_get_joined_timeseries_query(jtq)
             return tqu.remove_empty_lines(query)
-        elif jtq.include_geometry:
+
+        # Pass the filter values as query parameters
+        params = []
+        query = tqu_db.create_get_joined_timeseries_query(jtq, params)
+        if jtq.include_geometry:
             self._check_if_geometry_is_inserted()
-            df = self.query(query, format="df")
+            df = self.query(query, format="df", params=params)
             return tqu.df_to_gdf(df)
-        else:
-            df = self.query(query, format="df")
+        df = self.query(query, format="df", params=params)
         return df
 
     def get_timeseries(
@@ -1003,12 +1115,14 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
         }
         tq = self._validate_query_model(TimeseriesQuery, data)
 
-        query = tqu_db.create_get_timeseries_query(tq)
-
         if tq.return_query:
+            query = tqu_db.create_get_timeseries_query(tq)
             return tqu.remove_empty_lines(query)
-        else:
-            df = self.query(query, read_only=True, format="df")
+
+        # Pass the filter values as query parameters
+        params = []
+        query = tqu_db.create_get_timeseries_query(tq, params)
+        df = self.query(query, read_only=True, format="df", params=params)
         return df
 
     def get_timeseries_chars(
@@ -1065,12 +1179,14 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
         }
         tcq = self._validate_query_model(TimeseriesCharQuery, data)
 
-        query = tqu_db.create_get_timeseries_char_query(tcq)
-
         if tcq.return_query:
+            query = tqu_db.create_get_timeseries_char_query(tcq)
             return tqu.remove_empty_lines(query)
-        else:
-            df = self.query(query, read_only=True, format="df")
+
+        # Pass the filter values as query parameters
+        params = []
+        query = tqu_db.create_get_timeseries_char_query(tcq, params)
+        df = self.query(query, read_only=True, format="df", params=params)
         return df
 
     def get_unique_field_values(self, field_name: str) -> pd.DataFrame:
@@ -1093,6 +1209,4 @@ class TEEHRDatasetDB(TEEHRDatasetAPI):
         """
         data = {"field_name": field_name}
         fn = self._validate_query_model(JoinedTimeseriesFieldName, data)
-        query = tqu_db.create_unique_field_values_query(fn)
-        df = self.query(query, read_only=True, format="df")
-        return df
+        return self._get_cached_unique_field_values(fn, read_only=True)
@@ -167,28 +167,24 @@ def nwm_grids_to_parquet(
     """ # noqa
     # Import appropriate config model and dicts based on NWM version
     if nwm_version == SupportedNWMOperationalVersionsEnum.nwm22:
-        from teehr.models.loading.nwm22_grid import GridConfigurationModel
+        from teehr.models.loading.nwm22_grid import validate_grid
         analysis_config_dict = NWM22_ANALYSIS_CONFIG
         unit_lookup_dict = NWM22_UNIT_LOOKUP
     elif nwm_version == SupportedNWMOperationalVersionsEnum.nwm30:
-        from teehr.models.loading.nwm30_grid import GridConfigurationModel
+        from teehr.models.loading.nwm30_grid import validate_grid
         analysis_config_dict = NWM30_ANALYSIS_CONFIG
         unit_lookup_dict = NWM22_UNIT_LOOKUP
     else:
         raise ValueError("nwm_version must equal 'nwm22' or 'nwm30'")
 
     # Parse input parameters to validate configuration
-    vars = {
-        "configuration": configuration,
-        configuration: {
+    forecast_obj = validate_grid(
+        configuration,
+        {
             "output_type": output_type,
             output_type: variable_name,
-        },
-    }
-
-    cm = GridConfigurationModel.model_validate(vars)
-    configuration = cm.configuration.name
-    forecast_obj = getattr(cm, configuration)
+        }
+    )
     output_type = forecast_obj.output_type.name
     variable_name = getattr(forecast_obj, output_type).name
 
@@ -1,70 +1,371 @@
 """Module defining shared functions for processing NWM point data."""
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
-import re
+from typing import Dict, Iterable, List
+import functools
+import gc
+import logging
+import os
 
 import dask
+import fsspec
+import ujson  # fast json
 import numpy as np
 import pandas as pd
 import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
 
-from teehr.loading.nwm.utils import (
-    get_dataset,
-    write_parquet_file,
-)
+from teehr.loading.nwm.utils import get_dataset
+
+logger = logging.getLogger(__name__)
+
+
+def get_memory_pool() -> pa.MemoryPool:
+    """Return the Arrow memory pool used for the point data buffers.
+
+    jemalloc is preferred for its thread caches, falling back to the
+    system allocator if pyarrow was built without it.
+    """
+    try:
+        return pa.jemalloc_memory_pool()
+    except NotImplementedError:
+        return pa.system_memory_pool()
+
+
+# A single pool per worker process, so freed blocks are reused across
+#  files rather than requested from the allocator again.
+_POOL = get_memory_pool()
+
+
+@functools.lru_cache(maxsize=None)
+def get_point_schema() -> pa.Schema:
+    """Return the Arrow schema of the formatted NWM point data.
+
+    Arrow schemas are immutable, so a single instance is shared by
+    every chunk and task.
+    """
+    return pa.schema(
+        [
+            ("value", pa.float32()),
+            (
+                "reference_time",
+                pa.dictionary(pa.int32(), pa.timestamp("ms"))
+            ),
+            ("location_id", pa.dictionary(pa.int32(), pa.string())),
+            (
+                "value_time",
+                pa.dictionary(pa.int32(), pa.timestamp("ms"))
+            ),
+            ("configuration", pa.dictionary(pa.int32(), pa.string())),
+            ("variable_name", pa.dictionary(pa.int32(), pa.string())),
+            ("measurement_unit", pa.dictionary(pa.int32(), pa.string())),
+        ]
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def deserialize_schema(schema_bytes: bytes) -> pa.Schema:
+    """Read an Arrow schema from its serialized IPC bytes.
+
+    Cached so each worker only deserializes a given schema once.
+    """
+    return pa.ipc.read_schema(pa.py_buffer(schema_bytes))
+
+
+@functools.lru_cache(maxsize=8)
+def constant_dictionary_array(value: str, length: int) -> pa.DictionaryArray:
+    """Create a dictionary-encoded array repeating a single string value.
+
+    Results are cached since the same columns are built for every file
+    in a job, and Arrow arrays are immutable and safe to share.
+
+    Parameters
+    ----------
+    value : str
+        The string value to repeat.
+    length : int
+        The number of elements in the array.
+
+    Returns
+    -------
+    pa.DictionaryArray
+        An array of all-zero int32 indices into a one-item dictionary.
+    """
+    return pa.DictionaryArray.from_arrays(
+        np.zeros(length, dtype=np.int32),
+        pa.array([value], type=pa.string(), memory_pool=_POOL),
+        memory_pool=_POOL
+    )
+
+
+def time_dictionary_array(
+    times: np.ndarray,
+    length: int
+) -> pa.DictionaryArray:
+    """Create a dictionary-encoded timestamp array from unique time steps.
+
+    Each time step is repeated for an equal, contiguous share of the
+    ``length`` elements, so only the unique times are stored alongside
+    the int32 indices.
+
+    Parameters
+    ----------
+    times : np.ndarray
+        Array of the unique datetime64 time steps, in order.
+    length : int
+        The number of elements in the array.
+
+    Returns
+    -------
+    pa.DictionaryArray
+        An array of int32 indices into the millisecond timestamp values.
+    """
+    indices = np.repeat(
+        np.arange(times.size, dtype=np.int32), length // times.size
+    )
+    return pa.DictionaryArray.from_arrays(
+        indices,
+        pa.array(
+            times.astype("datetime64[ms]"),
+            type=pa.timestamp("ms"),
+            memory_pool=_POOL
+        ),
+        memory_pool=_POOL
+    )
+
+
+def build_location_id_array(
+    nwm_version: str,
+    feature_ids: np.ndarray
+) -> pa.StringArray:
+    """Build the TEEHR location ID array from NWM feature IDs.
+
+    The offsets and the contiguous utf-8 data buffer of the Arrow string
+    array are assembled with vectorized numpy operations and wrapped
+    without copying.
+
+    Parameters
+    ----------
+    nwm_version : str
+        The NWM version, used as the location ID prefix.
+    feature_ids : np.ndarray
+        Array of integer NWM feature IDs.
+
+    Returns
+    -------
+    pa.StringArray
+        Location IDs formatted as "{nwm_version}-{feature_id}".
+    """
+    prefix = np.frombuffer(f"{nwm_version}-".encode(), dtype=np.uint8)
+    digits = feature_ids.astype("S")
+    num_ids = digits.size
+    width = digits.itemsize
+    lengths = prefix.size + np.char.str_len(digits)
+
+    offsets = np.zeros(num_ids + 1, dtype=np.int32)
+    offsets[1:] = np.cumsum(lengths)
+
+    # Fixed-width rows of prefix + zero-padded digits, from which only
+    #  the valid bytes of each row are kept (in row order).
+    rows = np.empty((num_ids, prefix.size + width), dtype=np.uint8)
+    rows[:, :prefix.size] = prefix
+    rows[:, prefix.size:] = np.frombuffer(
+        digits.tobytes(), dtype=np.uint8
+    ).reshape(num_ids, width)
+    data = rows[np.arange(rows.shape[1]) < lengths[:, None]]
+
+    return pa.StringArray.from_buffers(
+        num_ids, pa.py_buffer(offsets), pa.py_buffer(data)
+    )
+
+
+def fetch_reference_jsons(
+    filepaths: List[str],
+    ignore_missing_file: bool
+) -> Dict[str, bytes]:
+    """Read a batch of kerchunk reference jsons concurrently.
+
+    Remote files are requested together through the asynchronous
+    fsspec filesystem, rather than one blocking request per file.
+    Paths with different protocols are read through separate
+    filesystems.
+
+    Parameters
+    ----------
+    filepaths : List[str]
+        Paths to the single json reference files. Can be local or remote.
+    ignore_missing_file : bool
+        Flag controlling whether to ignore missing files.
+
+    Returns
+    -------
+    Dict[str, bytes]
+        The contents of each file found, keyed by its filepath.
+    """
+    # A batch can mix remote jsons with jsons built locally, so the
+    #  paths are grouped by protocol and each group is read through
+    #  its own filesystem.
+    paths_by_protocol = {}
+    for filepath in filepaths:
+        protocol = fsspec.utils.get_protocol(filepath)
+        paths_by_protocol.setdefault(protocol, []).append(filepath)
+
+    contents = {}
+    for paths in paths_by_protocol.values():
+        fs, _ = fsspec.core.url_to_fs(paths[0], anon=True)
+        stripped_paths = [fs._strip_protocol(path) for path in paths]
+        group_contents = fs.cat(stripped_paths, on_error="return")
+        for filepath, stripped_path in zip(paths, stripped_paths):
+            contents[filepath] = group_contents.get(
+                stripped_path, FileNotFoundError(filepath)
+            )
+
+    references = {}
+    for filepath in filepaths:
+        content = contents[filepath]
+        if isinstance(content, FileNotFoundError):
+            if not ignore_missing_file:
+                raise content
+            continue
+        elif isinstance(content, Exception):
+            raise content
+        references[filepath] = content
+
+    return references
+
+
+@functools.lru_cache(maxsize=4)
+def location_id_dictionary_array(
+    nwm_version: str,
+    feature_ids_bytes: bytes
+) -> pa.DictionaryArray:
+    """Build the dictionary-encoded TEEHR location ID array.
+
+    The location ids are stored as int32 indices of the features into
+    a dictionary of the formatted id strings. Since the features are
+    selected in the same order from every file in a job, the array is
+    cached and reused rather than rebuilt for each file.
+
+    Parameters
+    ----------
+    nwm_version : str
+        The NWM version, used as the location ID prefix.
+    feature_ids_bytes : bytes
+        The raw bytes of the int32 NWM feature ID array.
+
+    Returns
+    -------
+    pa.DictionaryArray
+        Location IDs formatted as "{nwm_version}-{feature_id}".
+    """
+    feature_ids = np.frombuffer(feature_ids_bytes, dtype=np.int32)
+    return pa.DictionaryArray.from_arrays(
+        np.arange(feature_ids.size, dtype=np.int32),
+        build_location_id_array(nwm_version, feature_ids),
+        memory_pool=_POOL
+    )
+
+
+def build_point_batch(
+    vals: np.ndarray,
+    ref_time: np.datetime64,
+    valid_time: np.ndarray,
+    location_ids: pa.DictionaryArray,
+    configuration: str,
+    variable_name: str,
+    measurement_unit: str,
+    schema: pa.Schema
+) -> pa.RecordBatch:
+    """Assemble the record batch of formatted NWM point values for a file.
+
+    Parameters
+    ----------
+    vals : np.ndarray
+        The float32 values, ordered by value time then location.
+    ref_time : np.datetime64
+        The reference time of the file.
+    valid_time : np.ndarray
+        The unique value times of the file.
+    location_ids : pa.DictionaryArray
+        The dictionary-encoded TEEHR location IDs.
+    configuration : str
+        The configuration name.
+    variable_name : str
+        The variable name.
+    measurement_unit : str
+        The TEEHR measurement unit.
+    schema : pa.Schema
+        The point schema (see ``get_point_schema``).
+
+    Returns
+    -------
+    pa.RecordBatch
+        The values in the TEEHR timeseries data model.
+    """
+    num_vals = vals.size
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array(vals.ravel(), type=pa.float32(), memory_pool=_POOL),
+            time_dictionary_array(np.atleast_1d(ref_time), num_vals),
+            location_ids,
+            time_dictionary_array(valid_time, num_vals),
+            constant_dictionary_array(configuration, num_vals),
+            constant_dictionary_array(variable_name, num_vals),
+            constant_dictionary_array(measurement_unit, num_vals),
+        ],
+        schema=schema,
+    )
 
 
 @dask.delayed
 def file_chunk_loop(
-    row: Tuple,
-    location_ids: np.array,
-    variable_name: str,
-    configuration: str,
-    schema: pa.Schema,
-    ignore_missing_file: bool,
-    units_format_dict: Dict,
-    nwm_version: str
+    reference: bytes,
+    ref_time: np.datetime64,
+    shared: Dict
 ):
-    """Fetch NWM values and convert to tabular format for a single json."""
+    """Fetch NWM values and convert to tabular format for a single json.
+
+    The ``reference`` holds the contents of the kerchunk json, and the
+    ``shared`` dictionary holds the arguments common to every file
+    (location_ids, variable_name, configuration, schema_bytes,
+    ignore_missing_file, units_format_dict and nwm_version).
+    """
+    variable_name = shared["variable_name"]
+    configuration = shared["configuration"]
+    nwm_version = shared["nwm_version"]
+
     ds = get_dataset(
-        row.filepath,
-        ignore_missing_file,
-        target_options={'anon': True}
+        ujson.loads(reference),
+        shared["ignore_missing_file"]
     )
     if not ds:
         return None
-    ds = ds.sel(feature_id=location_ids)
+    ds = ds.sel(feature_id=shared["location_ids"])
     vals = ds[variable_name].astype("float32").values
     nwm22_units = ds[variable_name].units
-    teehr_units = units_format_dict.get(nwm22_units, nwm22_units)
-    ref_time = pd.to_datetime(row.day) \
-        + pd.to_timedelta(int(row.z_hour[1:3]), unit="h")
-
+    teehr_units = shared["units_format_dict"].get(nwm22_units, nwm22_units)
     valid_time = ds.time.values
     feature_ids = ds.feature_id.astype("int32").values
-    teehr_location_ids = \
-        [f"{nwm_version}-{feat_id}" for feat_id in feature_ids]
-    num_vals = vals.size
-
-    output_table = pa.table(
-        {
-            "value": vals,
-            "reference_time": np.full(vals.shape, ref_time),
-            "location_id": teehr_location_ids,
-            "value_time": np.full(vals.shape, valid_time),
-            "configuration": num_vals * [configuration],
-            "variable_name": num_vals * [variable_name],
-            "measurement_unit": num_vals * [teehr_units],
-        },
-        schema=schema,
+    teehr_location_ids = location_id_dictionary_array(
+        nwm_version, feature_ids.tobytes()
     )
 
-    return output_table
+    return build_point_batch(
+        vals=vals,
+        ref_time=ref_time,
+        valid_time=valid_time,
+        location_ids=teehr_location_ids,
+        configuration=configuration,
+        variable_name=variable_name,
+        measurement_unit=teehr_units,
+        schema=deserialize_schema(shared["schema_bytes"]),
+    )
 
 
 def process_chunk_of_files(
-    df: pd.DataFrame,
-    location_ids: Iterable[int],
+    refs: np.recarray,
+    location_ids: np.ndarray,
     configuration: str,
     variable_name: str,
     output_parquet_dir: str,
@@ -75,62 +376,137 @@ def process_chunk_of_files(
     nwm_version: str
 ):
     """Assemble a table for a chunk of NWM files."""
-    location_ids = np.array(location_ids).astype(int)
-
-    schema = pa.schema(
-        [
-            ("value", pa.float32()),
-            ("reference_time", pa.timestamp("ms")),
-            ("location_id", pa.string()),
-            ("value_time", pa.timestamp("ms")),
-            ("configuration", pa.string()),
-            ("variable_name", pa.string()),
-            ("measurement_unit", pa.string()),
-        ]
-    )
-
-    results = []
-    for row in df.itertuples():
-        results.append(
-            file_chunk_loop(
-                row,
-                location_ids,
-                variable_name,
-                configuration,
-                schema,
-                ignore_missing_file,
-                units_format_dict,
-                nwm_version
-            )
-        )
-    output = dask.compute(*results)
+    schema = get_point_schema()
 
-    if not any(output):
+    if len(refs) == 0:
+        # There are no files to name the output file after
+        if process_by_z_hour:
+            logger.info("No NWM files in the chunk; skipping")
+            return
         raise FileNotFoundError("No NWM files for specified input"
                                 "configuration were found in GCS!")
 
-    output = [tbl for tbl in output if tbl is not None]
-    output_table = pa.concat_tables(output)
-
     if process_by_z_hour:
-        row = df.iloc[0]
-        filename = f"{row.day}T{row.z_hour[1:3]}.parquet"
+        rec = refs[0]
+        filename = f"{rec.day}T{rec.z_hour[1:3]}.parquet"
     else:
         # Use start and end dates including forecast hour
         #  for the output file name.
-        filepath_list = df.filepath.sort_values().tolist()
+        filepath_list = np.sort(refs.filepath)
         start_json = filepath_list[0].split("/")[-1].split(".")
         start = f"{start_json[1]}T{start_json[3][1:3]}F{start_json[6][1:]}"
         end_json = filepath_list[-1].split("/")[-1].split(".")
         end = f"{end_json[1]}T{end_json[3][1:3]}F{end_json[6][1:]}"
         filename = f"{start}_{end}.parquet"
 
-    write_parquet_file(
-        Path(output_parquet_dir, filename),
-        overwrite_output,
-        output_table
+    filepath = Path(output_parquet_dir, filename)
+    if filepath.is_file() and not overwrite_output:
+        logger.info(
+            f"{filepath.name} already exists and overwrite_output=False;"
+            " skipping"
+        )
+        return
+    elif filepath.is_file():
+        logger.info(f"Overwriting {filepath.name}")
+
+    # Package the arguments common to every file (including the location
+    #  ids array) once, so they are stored in the graph a single time
+    #  rather than embedded in every task.
+    shared = dask.delayed(
+        {
+            "location_ids": location_ids,
+            "variable_name": variable_name,
+            "configuration": configuration,
+            # Ship the schema in its compact serialized IPC form
+            "schema_bytes": schema.serialize().to_pybytes(),
+            "ignore_missing_file": ignore_missing_file,
+            "units_format_dict": units_format_dict,
+            "nwm_version": nwm_version,
+        },
+        pure=True
     )
 
+    # Process the files in batches of about the number of workers and
+    #  write each record batch as it is returned, so that only a bounded
+    #  number of batches are held in memory at once. The reference jsons
+    #  of the next batch are fetched while the current batch is computed.
+    batch_size = os.cpu_count() or 1
+    ref_batches = [
+        refs[i:i + batch_size] for i in range(0, len(refs), batch_size)
+    ]
+    # Write to a temporary file that replaces the output file only once
+    #  every batch is written, so a failure part way through does not
+    #  leave a truncated file that later runs would skip.
+    tmp_filepath = Path(output_parquet_dir, f".{filename}.tmp")
+    num_batches_written = 0
+    pqwriter = None
+    completed = False
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # The first fetch is started inside the loop, so an empty
+            #  set of batches writes nothing rather than failing.
+            next_references = None
+            for i, ref_batch in enumerate(ref_batches):
+                if next_references is None:
+                    next_references = executor.submit(
+                        fetch_reference_jsons,
+                        ref_batch.filepath.tolist(),
+                        ignore_missing_file
+                    )
+                references = next_references.result()
+                next_references = None
+                if i + 1 < len(ref_batches):
+                    next_references = executor.submit(
+                        fetch_reference_jsons,
+                        ref_batches[i + 1].filepath.tolist(),
+                        ignore_missing_file
+                    )
+
+                results = []
+                for rec in ref_batch:
+                    if rec.filepath not in references:
+                        continue
+                    results.append(
+                        file_chunk_loop(
+                            references[rec.filepath], rec.ref_time, shared
+                        )
+                    )
+
+                output = dask.compute(*results)
+                for batch in output:
+                    if batch is None:
+                        continue
+                    # The dictionary-encoded columns are written as
+                    #  dictionary pages but without the arrow schema, so
+                    #  they are read back as plain strings and timestamps.
+                    if pqwriter is None:
+                        pqwriter = pq.ParquetWriter(
+                            tmp_filepath,
+                            schema,
+                            compression="zstd",
+                            compression_level=3,
+                            write_statistics=True,
+                            store_schema=False,
+                            memory_pool=_POOL
+                        )
+                    pqwriter.write_batch(batch)
+                    num_batches_written += 1
+        completed = True
+    finally:
+        if pqwriter is not None:
+            pqwriter.close()
+            if completed:
+                os.replace(tmp_filepath, filepath)
+            else:
+                tmp_filepath.unlink(missing_ok=True)
+        # Return the memory freed by this chunk to the system
+        gc.collect()
+        _POOL.release_unused()
+
+    if num_batches_written == 0:
+        raise FileNotFoundError("No NWM files for specified input"
+                                "configuration were found in GCS!")
+
 
 def fetch_and_format_nwm_points(
     json_paths: List[str],
@@ -185,38 +561,59 @@ def fetch_and_format_nwm_points(
     if not output_parquet_dir.exists():
         output_parquet_dir.mkdir(parents=True)
 
+    # Convert the location ids once for all chunks. Note that int64 is
+    #  required since some NWM v3.0 feature ids exceed the int32 range.
+    location_ids = np.asarray(location_ids, dtype=np.int64)
+
     # Format file list into a dataframe and group by specified method
-    pattern = re.compile(r'[0-9]+')
-    days = []
-    z_hours = []
-    for path in json_paths:
-        filename = Path(path).name
-        if path.split(":")[0] == "s3":
-            # If it's a remote json day and z-hour are in the path
-            res = re.findall(pattern, path)
-            days.append(res[1])
-            z_hours.append(f"t{res[2]}z")
-        else:
-            days.append(filename.split(".")[1])
-            z_hours.append(filename.split(".")[3])
+    paths = pd.Series(json_paths, dtype="object")
+    is_s3 = paths.str.startswith("s3:")
+    # If it's a remote json, day and z-hour are the second and third
+    #  numbers in the path
+    s3_parts = paths.str.extract(r"^\D*\d+\D+(\d+)\D+(\d+)")
+    # Otherwise they are in the local filename
+    name_parts = paths.str.extract(r"([^/\\]+)$")[0].str.split(".")
     df_refs = pd.DataFrame(
-        {"day": days, "z_hour": z_hours, "filepath": json_paths}
+        {
+            "day": np.where(is_s3, s3_parts[0], name_parts.str[1]),
+            "z_hour": np.where(
+                is_s3, "t" + s3_parts[1] + "z", name_parts.str[3]
+            ),
+            "filepath": paths,
+        }
     )
+    # Parse the reference times of all files at once, at the same
+    #  millisecond resolution as the output schema.
+    df_refs["ref_time"] = (
+        pd.to_datetime(df_refs.day)
+        + pd.to_timedelta(df_refs.z_hour.str[1:3].astype(int), unit="h")
+    ).astype("datetime64[ms]")
+    # The references are converted to a numpy record array once and
+    #  sliced, avoiding the overhead of pandas indexing for each chunk
+    #  and row.
+    refs = df_refs.to_records(index=False)
     if process_by_z_hour:
-        # Option #1. Groupby day and z_hour
-        gps = df_refs.groupby(["day", "z_hour"])
-        dfs = [df for _, df in gps]
+        # Option #1. Group by day and z_hour, by sorting the references
+        #  and splitting them where the key changes.
+        days = refs.day.astype(str)
+        z_hours = refs.z_hour.astype(str)
+        order = np.lexsort((z_hours, days))
+        refs = refs[order]
+        keys = np.char.add(days[order], z_hours[order])
+        _, idx = np.unique(keys, return_index=True)
+        # No references make no groups (rather than one empty chunk)
+        chunks = np.split(refs, np.sort(idx)[1:]) if refs.size else []
     else:
         # Option #2. Chunk by some number of files
         if stepsize > df_refs.index.size:
             num_partitions = 1
         else:
             num_partitions = int(df_refs.index.size / stepsize)
-        dfs = np.array_split(df_refs, num_partitions)
+        chunks = np.array_split(refs, num_partitions)
 
-    for df in dfs:
+    for refs in chunks:
         process_chunk_of_files(
-            df,
+            refs,
             location_ids,
             configuration,
             variable_name,
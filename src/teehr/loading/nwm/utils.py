@@ -27,7 +27,7 @@ from teehr.models.loading.utils import (
 from teehr.loading.nwm.const import (
     NWM_BUCKET,
     NWM_S3_JSON_PATH,
-    NWM30_START_DATE
+    NWM30_START_DATE,
 )
 
 logger = logging.getLogger(__name__)
@@ -137,7 +137,11 @@ def generate_json_paths(
 def write_parquet_file(
     filepath: Path,
     overwrite_output: bool,
-    data: Union[pa.Table, pd.DataFrame]
+    data: Union[pa.Table, pd.DataFrame],
+    compression: str = "zstd",
+    compression_level: int = 3,
+    write_statistics: bool = True,
+    **kwargs
 ):
     """Write the output timeseries parquet file.
 
@@ -151,18 +155,31 @@ def write_parquet_file(
         Flag controlling overwrite behavior.
     data : Union[pa.Table, pd.DataFrame]
         The output data as either a dataframe or pyarrow table.
+    compression : str
+        The compression codec, by default "zstd".
+    compression_level : int
+        The compression level of the codec, by default 3.
+    write_statistics : bool
+        Whether to write column statistics, by default True.
+    **kwargs
+        Additional keyword arguments passed to the parquet writer.
     """
+    kwargs.update(
+        compression=compression,
+        compression_level=compression_level,
+        write_statistics=write_statistics
+    )
     if not filepath.is_file():
         if isinstance(data, pa.Table):
-            pq.write_table(data, filepath)
+            pq.write_table(data, filepath, **kwargs)
         else:
-            data.to_parquet(filepath)
+            data.to_parquet(filepath, **kwargs)
     elif filepath.is_file() and overwrite_output:
         logger.info(f"Overwriting {filepath.name}")
         if isinstance(data, pa.Table):
-            pq.write_table(data, filepath)
+            pq.write_table(data, filepath, **kwargs)
         else:
-            data.to_parquet(filepath)
+            data.to_parquet(filepath, **kwargs)
     elif filepath.is_file() and not overwrite_output:
         logger.info(
             f"{filepath.name} already exists and overwrite_output=False;"
@@ -8,7 +8,7 @@ except ImportError:  # pragma: no cover
     class StrEnum(str, Enum):  # pragma: no cover
         pass  # pragma: no cover
 
-from typing import Optional
+from typing import Dict, Optional, get_args
 
 from pydantic import BaseModel
 
@@ -111,6 +111,43 @@ class GridConfigurationModel(BaseModel):
     forcing_analysis_assim_alaska: Optional[Forcing] = None
 
 
+# OUTPUT TYPE MODEL OF EACH CONFIGURATION
+#  (read from the GridConfigurationModel field annotations)
+CONFIG_TO_MODEL = {
+    name: next(
+        arg for arg in get_args(field.annotation) if arg is not type(None)
+    )
+    for name, field in GridConfigurationModel.model_fields.items()
+    if name != "configuration"
+}
+
+
+def validate_grid(configuration: str, subpayload: Dict) -> BaseModel:
+    """Validate the output type and variable of a grid configuration.
+
+    The output type model is looked up directly by configuration, rather
+    than validating the full GridConfigurationModel.
+
+    Parameters
+    ----------
+    configuration : str
+        The NWM v3.0 grid configuration.
+    subpayload : Dict
+        The output type and variable name of the configuration, ie.,
+        {"output_type": "forcing", "forcing": "RAINRATE"}.
+
+    Returns
+    -------
+    BaseModel
+        The validated output type model.
+    """
+    if configuration not in CONFIG_TO_MODEL:
+        raise ValueError(
+            f"Invalid NWM v3.0 grid configuration: {configuration}"
+        )
+    return CONFIG_TO_MODEL[configuration].model_validate(subpayload)
+
+
 if __name__ == "__main__":
     # So for example:
     configuration = "forcing_medium_range_blend_alaska"
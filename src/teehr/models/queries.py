@@ -109,6 +109,23 @@ class TimeseriesFilterFieldEnum(StrEnum):
     geometry = "geometry"
 
 
+def validate_in_operator(operator: str, value):
+    """Ensure that iterable values are used with, and only with, 'in'.
+
+    Shared by the ``value`` validators of the filter models.
+    """
+    is_iterable_not_str = (
+        isinstance(value, Iterable) and not isinstance(value, str)
+    )
+    if is_iterable_not_str and operator != "in":
+        raise ValueError("iterable value must be used with 'in' operator")
+
+    if operator == "in" and not is_iterable_not_str:
+        raise ValueError(
+            "'in' operator can only be used with iterable value"
+        )
+
+
 class JoinedFilter(BaseModel):
     """Joined filter model."""
 
@@ -118,23 +135,10 @@ class JoinedFilter(BaseModel):
         str, int, float, datetime, List[Union[str, int, float, datetime]]
     ]
 
-    def is_iterable_not_str(obj):
-        """Check if is type Iterable and not str."""
-        if isinstance(obj, Iterable) and not isinstance(obj, str):
-            return True
-        return False
-
     @field_validator("value")
     def in_operator_must_have_iterable(cls, v, info: ValidationInfo):
         """Ensure that an 'in' operator has an iterable type."""
-        if cls.is_iterable_not_str(v) and info.data["operator"] != "in":
-            raise ValueError("iterable value must be used with 'in' operator")
-
-        if info.data["operator"] == "in" and not cls.is_iterable_not_str(v):
-            raise ValueError(
-                "'in' operator can only be used with iterable value"
-            )
-
+        validate_in_operator(info.data["operator"], v)
         return v
 
 
@@ -147,22 +151,10 @@ class TimeseriesFilter(BaseModel):
         str, int, float, datetime, List[Union[str, int, float, datetime]]
     ]
 
-    def is_iterable_not_str(obj):
-        """Check if is type Iterable and not str."""
-        if isinstance(obj, Iterable) and not isinstance(obj, str):
-            return True
-        return False
-
     @field_validator("value")
     def in_operator_must_have_iterable(cls, v, info: ValidationInfo):
         """Ensure that an 'in' operator has an iterable type."""
-        if cls.is_iterable_not_str(v) and info.data["operator"] != "in":
-            raise ValueError("iterable value must be used with 'in' operator")
-
-        if info.data["operator"] == "in" and not cls.is_iterable_not_str(v):
-            raise ValueError(
-                "'in' operator can only be used with iterable value"
-            )
+        validate_in_operator(info.data["operator"], v)
         return v
 
 
@@ -1,5 +1,4 @@
 """Module for database query models."""
-from collections.abc import Iterable
 from datetime import datetime
 try:
     # breaking change introduced in python 3.11
@@ -16,7 +15,11 @@ from pydantic import BaseModel as PydanticBaseModel
 from pydantic import ValidationInfo, field_validator, model_validator
 from pathlib import Path
 
-from teehr.models.queries import FilterOperatorEnum, MetricEnum
+from teehr.models.queries import (
+    FilterOperatorEnum,
+    MetricEnum,
+    validate_in_operator
+)
 
 
 class BaseModel(PydanticBaseModel):
@@ -134,25 +137,12 @@ class Filter(BaseModel):
         str, int, float, datetime, List[Union[str, int, float, datetime]]
     ]
 
-    def is_iterable_not_str(obj):
-        """Check if obj is iterable and not str."""
-        if isinstance(obj, Iterable) and not isinstance(obj, str):
-            return True
-        return False
-
     @field_validator("value")
     def in_operator_must_have_iterable(
         cls, v: str, info: ValidationInfo
     ) -> str:
         """Ensure the 'in' operator has an iterable."""
-        if cls.is_iterable_not_str(v) and info.data["operator"] != "in":
-            raise ValueError("iterable value must be used with 'in' operator")
-
-        if info.data["operator"] == "in" and not cls.is_iterable_not_str(v):
-            raise ValueError(
-                "'in' operator can only be used with iterable value"
-            )
-
+        validate_in_operator(info.data["operator"], v)
         return v
 
 
@@ -163,6 +153,32 @@ class InsertJoinedTimeseriesQuery(BaseModel):
     secondary_filepath: Union[str, Path]
     crosswalk_filepath: Union[str, Path]
     order_by: Optional[List[JoinedFieldNameEnum]] = []
+    filters: Optional[List[Filter]] = []
+
+    @field_validator("filters")
+    def filter_must_be_list(cls, v):
+        """Filter must be a list."""
+        if v is None:
+            return []
+        return v
+
+    @field_validator("filters")
+    def filters_must_be_base_fields(cls, v):
+        """Filter fields must be base joined_timeseries fields."""
+        for val in v:
+            if val.column not in JoinedFieldNameEnum.__members__:
+                raise ValueError(
+                    f"The filters field {val.column} is not a"
+                    " joined_timeseries field"
+                )
+            # Geometry is not a column of the inserted rows (it is joined
+            #  from the geometry table when queried).
+            if val.column == JoinedFieldNameEnum.geometry:
+                raise ValueError(
+                    f"The filters field {val.column} is not available"
+                    " when inserting joined_timeseries"
+                )
+        return v
 
 
 class JoinedTimeseriesQuery(BaseModel):
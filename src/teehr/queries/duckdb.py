@@ -193,37 +193,7 @@ def get_metrics(
         , metrics AS (
             SELECT
                 {",".join([f"joined.{gb}" for gb in mq.group_by])}
-                {tqu._select_primary_count(mq)}
-                {tqu._select_secondary_count(mq)}
-                {tqu._select_primary_minimum(mq)}
-                {tqu._select_secondary_minimum(mq)}
-                {tqu._select_primary_maximum(mq)}
-                {tqu._select_secondary_maximum(mq)}
-                {tqu._select_primary_average(mq)}
-                {tqu._select_secondary_average(mq)}
-                {tqu._select_primary_sum(mq)}
-                {tqu._select_secondary_sum(mq)}
-                {tqu._select_primary_variance(mq)}
-                {tqu._select_secondary_variance(mq)}
-                {tqu._select_max_value_delta(mq)}
-                {tqu._select_mean_error(mq)}
-                {tqu._select_nash_sutcliffe_efficiency(mq)}
-                {tqu._select_nash_sutcliffe_efficiency_normalized(mq)}
-                {tqu._select_kling_gupta_efficiency(mq)}
-                {tqu._select_kling_gupta_efficiency_mod1(mq)}
-                {tqu._select_kling_gupta_efficiency_mod2(mq)}
-                {tqu._select_mean_absolute_error(mq)}
-                {tqu._select_mean_squared_error(mq)}
-                {tqu._select_root_mean_squared_error(mq)}
-                {tqu._select_primary_max_value_time(mq)}
-                {tqu._select_secondary_max_value_time(mq)}
-                {tqu._select_max_value_timedelta(mq)}
-                {tqu._select_relative_bias(mq)}
-                {tqu._select_multiplicative_bias(mq)}
-                {tqu._select_mean_absolute_relative_error(mq)}
-                {tqu._select_pearson_correlation(mq)}
-                {tqu._select_r_squared(mq)}
-                {tqu._select_spearman_correlation(mq)}
+                {tqu._select_metrics(mq)}
             FROM
                 joined
                 {tqu._join_nse_cte(mq)}
@@ -578,7 +548,8 @@ def get_timeseries_chars(
         join="mxt", join_to="chars", join_on=tcq.group_by
     )
 
-    order_by = [f"chars.{val}" for val in tcq.order_by]
+    group_by = ",".join(tcq.group_by)
+    order_by = ",".join([f"chars.{val}" for val in tcq.order_by])
 
     query = f"""
         WITH fts AS (
@@ -588,18 +559,18 @@ def get_timeseries_chars(
         ),
         mxt AS (
             SELECT
-                {",".join(tcq.group_by)}
+                {group_by}
                 , value
                 , value_time
                 , ROW_NUMBER() OVER(
-                    PARTITION BY {",".join(tcq.group_by)}
+                    PARTITION BY {group_by}
                     ORDER BY value DESC, value_time
                 ) as n
             FROM fts
         ),
         chars AS (
             SELECT
-                {",".join(tcq.group_by)}
+                {group_by}
                 ,count(fts.value) as count
                 ,min(fts.value) as min
                 ,max(fts.value) as max
@@ -609,7 +580,7 @@ def get_timeseries_chars(
             FROM
                 fts
             GROUP BY
-                {",".join(tcq.group_by)}
+                {group_by}
         )
         SELECT
             chars.*
@@ -617,7 +588,7 @@ def get_timeseries_chars(
         FROM chars
             {join_max_time_on}
         ORDER BY
-            {",".join(order_by)}
+            {order_by}
     ;"""
 
     if tcq.return_query:
@@ -1,7 +1,9 @@
 """A module defining duckdb sql queries for a persistent database."""
 import duckdb
+import numpy as np
+import pandas as pd
 
-from typing import Dict
+from typing import Dict, List, Optional
 
 from teehr.models.queries_database import (
     MetricQuery,
@@ -16,14 +18,34 @@ import teehr.queries.utils as tqu
 
 SQL_DATETIME_STR_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-
-def create_get_metrics_query(mq: MetricQuery) -> str:
+# joined_timeseries fields written on insert, in table order.
+JOINED_TIMESERIES_STORED_FIELDS = [
+    "reference_time",
+    "value_time",
+    "secondary_location_id",
+    "secondary_value",
+    "configuration",
+    "measurement_unit",
+    "variable_name",
+    "primary_value",
+    "primary_location_id",
+    "lead_time",
+]
+
+
+def create_get_metrics_query(
+    mq: MetricQuery,
+    params: Optional[List] = None
+) -> str:
     """Build the query string to calculate performance metrics.
 
     Parameters
     ----------
     mq : MetricQuery
         Pydantic model containing query parameters.
+    params : Optional[List]
+        If provided, the filter values are appended to this list of query
+        parameters and replaced by ``?`` placeholders in the query string.
 
     Returns
     -------
@@ -98,11 +120,11 @@ def create_get_metrics_query(mq: MetricQuery) -> str:
     >>> ]
     """
     query = f"""
-        WITH joined as (
+        WITH joined AS MATERIALIZED (
             SELECT
-                *
+                {tqu._select_joined_fields(mq)}
             FROM joined_timeseries sf
-            {tqu.filters_to_sql(mq.filters)}
+            {tqu.filters_to_sql(mq.filters, params)}
         )
         {tqu._nse_cte(mq)}
         {tqu._annual_metrics_cte(mq)}
@@ -110,37 +132,7 @@ def create_get_metrics_query(mq: MetricQuery) -> str:
         , metrics AS (
             SELECT
                 {",".join([f"joined.{gb}" for gb in mq.group_by])}
-                {tqu._select_primary_count(mq)}
-                {tqu._select_secondary_count(mq)}
-                {tqu._select_primary_minimum(mq)}
-                {tqu._select_secondary_minimum(mq)}
-                {tqu._select_primary_maximum(mq)}
-                {tqu._select_secondary_maximum(mq)}
-                {tqu._select_primary_average(mq)}
-                {tqu._select_secondary_average(mq)}
-                {tqu._select_primary_sum(mq)}
-                {tqu._select_secondary_sum(mq)}
-                {tqu._select_primary_variance(mq)}
-                {tqu._select_secondary_variance(mq)}
-                {tqu._select_max_value_delta(mq)}
-                {tqu._select_mean_error(mq)}
-                {tqu._select_nash_sutcliffe_efficiency(mq)}
-                {tqu._select_nash_sutcliffe_efficiency_normalized(mq)}
-                {tqu._select_kling_gupta_efficiency(mq)}
-                {tqu._select_kling_gupta_efficiency_mod1(mq)}
-                {tqu._select_kling_gupta_efficiency_mod2(mq)}
-                {tqu._select_mean_absolute_error(mq)}
-                {tqu._select_mean_squared_error(mq)}
-                {tqu._select_root_mean_squared_error(mq)}
-                {tqu._select_primary_max_value_time(mq)}
-                {tqu._select_secondary_max_value_time(mq)}
-                {tqu._select_max_value_timedelta(mq)}
-                {tqu._select_relative_bias(mq)}
-                {tqu._select_multiplicative_bias(mq)}
-                {tqu._select_mean_absolute_relative_error(mq)}
-                {tqu._select_pearson_correlation(mq)}
-                {tqu._select_r_squared(mq)}
-                {tqu._select_spearman_correlation(mq)}
+                {tqu._select_metrics(mq)}
             FROM
                 joined
                 {tqu._join_nse_cte(mq)}
@@ -162,19 +154,39 @@ def create_get_metrics_query(mq: MetricQuery) -> str:
     return query
 
 
-def create_join_and_save_timeseries_query(jtq: JoinedTimeseriesQuery) -> str:
+def create_join_and_save_timeseries_query(
+    jtq: JoinedTimeseriesQuery,
+    store_absolute_difference: bool = True
+) -> str:
     """Load joined timeseries into a duckdb persistent database.
 
+    Filters on the fields identifying a timeseries value are applied while
+    reading the primary and secondary files, the rest after joining.
+
     Parameters
     ----------
     jtq : JoinedTimeseriesQuery
         Pydantic model containing query parameters.
+    store_absolute_difference : bool, optional
+        Whether absolute_difference is written to the joined_timeseries
+        table (True), or is a generated column computed when read (False).
+        By default True.
 
     Returns
     -------
     str
         The query string.
     """
+    secondary_filters = tqu.source_filters_to_sql(
+        jtq.filters, tqu.SECONDARY_PREFILTER_COLUMNS
+    )
+    primary_filters = tqu.source_filters_to_sql(
+        jtq.filters, tqu.PRIMARY_PREFILTER_COLUMNS
+    )
+    insert_fields = list(JOINED_TIMESERIES_STORED_FIELDS)
+    if store_absolute_difference:
+        insert_fields.append("absolute_difference")
+
     query = f"""
     WITH initial_joined as (
         SELECT
@@ -187,52 +199,73 @@ def create_join_and_save_timeseries_query(jtq: JoinedTimeseriesQuery) -> str:
             pf.reference_time as primary_reference_time,
             sf.variable_name,
             pf.value as primary_value,
-            pf.location_id as primary_location_id,
-            sf.value_time - sf.reference_time as lead_time,
-            abs(primary_value - secondary_value) as absolute_difference
-        FROM read_parquet('{str(jtq.secondary_filepath)}') sf
+            pf.location_id as primary_location_id
+        FROM (
+            SELECT * FROM read_parquet('{str(jtq.secondary_filepath)}') sf
+            {secondary_filters}
+        ) sf
         JOIN read_parquet('{str(jtq.crosswalk_filepath)}') cf
             on cf.secondary_location_id = sf.location_id
-        JOIN read_parquet("{str(jtq.primary_filepath)}") pf
+        JOIN (
+            SELECT * FROM read_parquet("{str(jtq.primary_filepath)}") pf
+            {primary_filters}
+        ) pf
             on cf.primary_location_id = pf.location_id
             and sf.value_time = pf.value_time
             and sf.measurement_unit = pf.measurement_unit
             and sf.variable_name = pf.variable_name
     ),
+    -- Keep the row with the latest primary reference time for each
+    -- timeseries value (null reference times sort last, as in a
+    -- descending order), using one hash aggregation rather than a
+    -- windowed sort of all rows.
+    latest AS (
+        SELECT
+            reference_time
+            , value_time
+            , primary_location_id
+            , configuration
+            , variable_name
+            , measurement_unit
+            , arg_max(
+                {{
+                    'secondary_location_id': secondary_location_id,
+                    'secondary_value': secondary_value,
+                    'primary_value': primary_value
+                }},
+                COALESCE(primary_reference_time, '-infinity'::TIMESTAMP)
+            ) AS latest_row
+        FROM initial_joined
+        GROUP BY
+            reference_time
+            , value_time
+            , primary_location_id
+            , configuration
+            , variable_name
+            , measurement_unit
+    ),
     joined AS (
         SELECT
             reference_time
             , value_time
-            , secondary_location_id
-            , secondary_value
+            , latest_row.secondary_location_id AS secondary_location_id
+            , latest_row.secondary_value AS secondary_value
             , configuration
             , measurement_unit
             , variable_name
-            , primary_value
+            , latest_row.primary_value AS primary_value
             , primary_location_id
-            , lead_time
-            , absolute_difference
-        FROM(
-            SELECT *,
-                row_number()
-            OVER(
-                PARTITION BY value_time,
-                             primary_location_id,
-                             configuration,
-                             variable_name,
-                             measurement_unit,
-                             reference_time
-                ORDER BY primary_reference_time desc
-                ) AS rn
-            FROM initial_joined
-            )
-        WHERE rn = 1
+            , value_time - reference_time AS lead_time
+            , abs(latest_row.primary_value - latest_row.secondary_value)
+                AS absolute_difference
+        FROM latest
     )
-    INSERT INTO joined_timeseries
+    INSERT INTO joined_timeseries ({", ".join(insert_fields)})
     SELECT
-        *
+        {", ".join(insert_fields)}
     FROM
-        joined
+        joined sf
+    {tqu.joined_filters_to_sql(jtq.filters)}
     ORDER BY
         {",".join(jtq.order_by)}
     ;"""
@@ -240,7 +273,11 @@ def create_join_and_save_timeseries_query(jtq: JoinedTimeseriesQuery) -> str:
     return query
 
 
-def describe_timeseries(timeseries_filepath: str) -> Dict:
+def describe_timeseries(
+    timeseries_filepath: str,
+    con: Optional[duckdb.DuckDBPyConnection] = None,
+    exact: bool = True
+) -> Dict:
     r"""Retrieve descriptive stats for a time series.
 
     Parameters
@@ -248,116 +285,169 @@ def describe_timeseries(timeseries_filepath: str) -> Dict:
     timeseries_filepath : str
         File path to the "observed" data.  String must include path to file(s)
         and can include wildcards. For example, "/path/to/parquet/\\*.parquet".
+    con : Optional[duckdb.DuckDBPyConnection]
+        An open connection to run the query with, so it can be shared
+        between calls. By default a new in-memory connection is used.
+    exact : bool
+        Whether location IDs are counted exactly (True), or estimated with
+        approx_count_distinct (False), which uses constant memory.
+        By default True.
 
     Returns
     -------
     Dict
         A dictionary of summary statistics for a timeseries.
     """
-    # Find number of rows and unique locations
-    query = f"""
-        SELECT
-        COUNT ( DISTINCT
-            location_id
-        )
-        AS num_location_ids,
-        COUNT(*) AS num_rows,
-        MAX(value_time) as end_date,
-        MIN(value_time) as start_date
-        FROM read_parquet("{timeseries_filepath}")
-        """
-    df = duckdb.sql(query).to_df()
-    num_location_ids = df["num_location_ids"][0]
-    total_num_rows = df["num_rows"][0]
-    start_date = df["start_date"][0]
-    end_date = df["end_date"][0]
-
-    # Find number of duplicates from all columns
-    query = f"""
-        SELECT
-            value_time,
-            location_id,
-            value,
-            measurement_unit,
-            reference_time,
-            configuration,
-            variable_name,
-        COUNT(*)
-        FROM read_parquet("{timeseries_filepath}")
-        GROUP BY
-            value_time,
-            location_id,
-            value,
-            measurement_unit,
-            reference_time,
-            configuration,
-            variable_name,
-        HAVING COUNT(*) > 1
-        """
-    df = duckdb.sql(query).to_df()
-    num_duplicate_rows = df.index.size
+    if exact:
+        count_distinct = "COUNT(DISTINCT location_id)"
+    else:
+        count_distinct = "approx_count_distinct(location_id)"
 
-    # Find number of duplicate value_times per location_id
+    # Read the file once and calculate all statistics in a single query
     query = f"""
-        WITH find_duplicates AS (
+        WITH src AS MATERIALIZED (
             SELECT
-                value_time,
                 location_id,
-                measurement_unit,
-                configuration,
-                variable_name,
-            COUNT(*) AS num_duplicates
-            FROM read_parquet("{timeseries_filepath}")
-            GROUP BY
                 value_time,
-                location_id,
+                value,
                 measurement_unit,
+                reference_time,
                 configuration,
-                variable_name,
-            HAVING COUNT(*) > 1
-        )
-        SELECT
-        COUNT( DISTINCT location_id)
-        AS num_locations_with_duplicates
-        FROM find_duplicates
-        WHERE num_duplicates > 1
-        """
-    df = duckdb.sql(query).to_df()
-    num_locations_with_duplicate_value_times = df[
-        "num_locations_with_duplicates"
-    ][0]
-
-    # Check time step integrity by reference_time and location_id
-    query = f"""
-        WITH value_time_diff AS (
-            SELECT *,
-                value_time - LAG(value_time)
-            OVER(PARTITION BY
-                location_id,
-                reference_time
-            ORDER BY value_time)
-            AS value_time_step
+                variable_name
             FROM read_parquet("{timeseries_filepath}")
         ),
-        missing_timesteps AS (
+        -- Find number of rows and unique locations
+        summary AS (
+            SELECT
+                {count_distinct} AS num_location_ids,
+                COUNT(*) AS num_rows,
+                MIN(value_time) AS start_date,
+                MAX(value_time) AS end_date
+            FROM src
+        ),
+        -- Find number of duplicates from all columns
+        duplicate_rows AS (
+            SELECT
+                COUNT(*) AS num_duplicate_rows
+            FROM (
+                SELECT 1
+                FROM src
+                GROUP BY
+                    value_time,
+                    location_id,
+                    value,
+                    measurement_unit,
+                    reference_time,
+                    configuration,
+                    variable_name,
+                HAVING COUNT(*) > 1
+            )
+        ),
+        -- Find number of duplicate value_times per location_id
+        duplicate_value_times AS (
+            SELECT
+                {count_distinct} AS num_locations_with_duplicates
+            FROM (
+                SELECT location_id
+                FROM src
+                GROUP BY
+                    value_time,
+                    location_id,
+                    measurement_unit,
+                    configuration,
+                    variable_name,
+                HAVING COUNT(*) > 1
+            )
+        ),
+        -- Check time step integrity by reference_time and location_id.
+        -- A series is evenly spaced if its value times are distinct and
+        -- all fall on the grid from the first value time with a step of
+        -- span / (count - 1), which avoids a sorted LAG window.
+        value_time_spans AS (
             SELECT
                 location_id,
                 reference_time,
-                MAX(value_time_step) AS max_timestep,
-                MIN(value_time_step) AS min_timestep,
-                max_timestep = min_timestep AS none_missing
-            FROM value_time_diff
+                COUNT(*) AS num_value_times,
+                COUNT(DISTINCT value_time) AS num_distinct_value_times,
+                MIN(value_time) AS first_value_time,
+                date_diff(
+                    'microsecond', MIN(value_time), MAX(value_time)
+                ) AS span
+            FROM src
             GROUP BY location_id, reference_time
-        )
+        ),
+        value_time_steps AS (
             SELECT
-                location_id,
-                reference_time,
-                none_missing
-            FROM missing_timesteps
-            WHERE none_missing != TRUE
+                *,
+                CASE
+                    WHEN span % (num_value_times - 1) = 0
+                    THEN span // (num_value_times - 1)
+                END AS value_time_step
+            FROM value_time_spans
+            WHERE span > 0
+        ),
+        missing_timesteps AS (
+            SELECT
+                COUNT(*) AS num_locations_with_missing_timesteps
+            FROM value_time_steps vts
+            WHERE
+                vts.num_distinct_value_times < vts.num_value_times
+                OR vts.value_time_step IS NULL
+                OR EXISTS (
+                    SELECT 1
+                    FROM src
+                    WHERE
+                        src.location_id = vts.location_id
+                        AND src.reference_time
+                            IS NOT DISTINCT FROM vts.reference_time
+                        AND date_diff(
+                            'microsecond',
+                            vts.first_value_time,
+                            src.value_time
+                        ) % vts.value_time_step != 0
+                )
+        )
+        SELECT
+            summary.num_location_ids,
+            summary.num_rows,
+            summary.start_date,
+            summary.end_date,
+            duplicate_rows.num_duplicate_rows,
+            duplicate_value_times.num_locations_with_duplicates,
+            missing_timesteps.num_locations_with_missing_timesteps
+        FROM
+            summary,
+            duplicate_rows,
+            duplicate_value_times,
+            missing_timesteps
         """
-    df = duckdb.sql(query).to_df()
-    num_locations_with_missing_timesteps = df.index.size
+    if con is None:
+        with duckdb.connect() as con:
+            row = con.execute(query).fetchone()
+    else:
+        row = con.execute(query).fetchone()
+    (
+        num_location_ids,
+        total_num_rows,
+        start_date,
+        end_date,
+        num_duplicate_rows,
+        num_locations_with_duplicate_value_times,
+        num_locations_with_missing_timesteps
+    ) = row
+    # Convert the python scalars of the single row to the pandas/numpy
+    #  types (e.g., pd.Timestamp dates) of the report.
+    num_location_ids = np.int64(num_location_ids)
+    total_num_rows = np.int64(total_num_rows)
+    start_date = pd.Timestamp(start_date)
+    end_date = pd.Timestamp(end_date)
+    num_duplicate_rows = int(num_duplicate_rows)
+    num_locations_with_duplicate_value_times = np.int64(
+        num_locations_with_duplicate_value_times
+    )
+    num_locations_with_missing_timesteps = int(
+        num_locations_with_missing_timesteps
+    )
 
     output_report = {
         "Number of unique location IDs": num_location_ids,
@@ -375,7 +465,8 @@ def describe_timeseries(timeseries_filepath: str) -> Dict:
 
 
 def create_get_joined_timeseries_query(
-    jtq: JoinedTimeseriesQuery
+    jtq: JoinedTimeseriesQuery,
+    params: Optional[List] = None
 ) -> str:
     """Retrieve joined timeseries using database query.
 
@@ -383,6 +474,9 @@ def create_get_joined_timeseries_query(
     ----------
     jtq : JoinedTimeseriesQuery
         Pydantic model containing query parameters.
+    params : Optional[List]
+        If provided, the filter values are appended to this list of query
+        parameters and replaced by ``?`` placeholders in the query string.
 
     Returns
     -------
@@ -445,7 +539,7 @@ def create_get_joined_timeseries_query(
         FROM
             joined_timeseries sf
         {tqu.metric_geometry_join_clause_db(jtq)}
-        {tqu.filters_to_sql(jtq.filters)}
+        {tqu.filters_to_sql(jtq.filters, params)}
         ORDER BY
             {",".join(jtq.order_by)}
     ;"""
@@ -454,7 +548,8 @@ def create_get_joined_timeseries_query(
 
 
 def create_get_timeseries_query(
-    tq: TimeseriesQuery
+    tq: TimeseriesQuery,
+    params: Optional[List] = None
 ) -> str:
     """Retrieve joined timeseries using database query.
 
@@ -462,6 +557,9 @@ def create_get_timeseries_query(
     ----------
     tq : TimeseriesQuery
         Pydantic model containing query parameters.
+    params : Optional[List]
+        If provided, the filter values are appended to this list of query
+        parameters and replaced by ``?`` placeholders in the query string.
 
     Returns
     -------
@@ -518,24 +616,42 @@ def create_get_timeseries_query(
     >>> ]
     """
     if tq.timeseries_name == "primary":
+        # Keep the first row of each primary value (by reference_time)
+        #  rather than aggregating every field of the joined rows.
         query = f"""
+            WITH primary_timeseries AS (
+                SELECT DISTINCT ON (
+                    value_time,
+                    primary_location_id,
+                    measurement_unit,
+                    variable_name
+                )
+                    reference_time,
+                    primary_value,
+                    value_time,
+                    primary_location_id,
+                    measurement_unit,
+                    variable_name,
+                FROM
+                    joined_timeseries sf
+                {tqu.filters_to_sql(tq.filters, params)}
+                ORDER BY
+                    value_time,
+                    primary_location_id,
+                    measurement_unit,
+                    variable_name,
+                    reference_time
+            )
             SELECT
-                ANY_VALUE(reference_time) AS reference_time,
-                ANY_VALUE(primary_value) AS value,
+                reference_time,
+                primary_value AS value,
                 value_time,
                 primary_location_id AS location_id,
                 'primary' as configuration,
                 measurement_unit,
                 variable_name,
             FROM
-                joined_timeseries sf
-            {tqu.filters_to_sql(tq.filters)}
-            GROUP BY
-                value_time,
-                primary_location_id,
-                --configuration,
-                measurement_unit,
-                variable_name,
+                primary_timeseries
             ORDER BY
                 {",".join(tq.order_by)}
         ;"""
@@ -551,7 +667,7 @@ def create_get_timeseries_query(
                 variable_name,
             FROM
                 joined_timeseries sf
-            {tqu.filters_to_sql(tq.filters)}
+            {tqu.filters_to_sql(tq.filters, params)}
             ORDER BY
                 {",".join(tq.order_by)}
         ;"""
@@ -559,13 +675,19 @@ def create_get_timeseries_query(
     return query
 
 
-def create_get_timeseries_char_query(tcq: TimeseriesCharQuery) -> str:
+def create_get_timeseries_char_query(
+    tcq: TimeseriesCharQuery,
+    params: Optional[List] = None
+) -> str:
     """Retrieve joined timeseries using database query.
 
     Parameters
     ----------
     tcq : TimeseriesCharQuery
         Pydantic model containing query parameters.
+    params : Optional[List]
+        If provided, the filter values are appended to this list of query
+        parameters and replaced by ``?`` placeholders in the query string.
 
     Returns
     -------
@@ -608,11 +730,9 @@ def create_get_timeseries_char_query(tcq: TimeseriesCharQuery) -> str:
     >>>     {"column": "lead_time", "operator": "<=", "value": "10 hours"},
     >>> ]
     """
-    join_max_time_on = tqu._join_time_on(
-        join="mxt", join_to="chars", join_on=tcq.group_by
-    )
-
-    order_by = [f"chars.{val}" for val in tcq.order_by]
+    group_by = ",".join(tcq.group_by)
+    order_by = ",".join([f"chars.{val}" for val in tcq.order_by])
+    ts_value = f"fts.{tcq.timeseries_name}_value"
 
     # Create the fts_clause to remove duplicates if primary time series
     # has been specified
@@ -630,12 +750,17 @@ def create_get_timeseries_char_query(tcq: TimeseriesCharQuery) -> str:
         gb_fields = ""
         for gb_fld in tcq.group_by:
             if gb_fld not in selected_primary_fields:
-                gb_fields += f"ANY_VALUE({gb_fld}) as {gb_fld}, "
+                gb_fields += f"{gb_fld}, "
 
         fts_clause = f"""
-                     SELECT
-                        ANY_VALUE(reference_time) AS reference_time,
-                        ANY_VALUE(primary_value) AS primary_value,
+                     SELECT DISTINCT ON (
+                        value_time,
+                        primary_location_id,
+                        measurement_unit,
+                        variable_name
+                     )
+                        reference_time,
+                        primary_value,
                         value_time,
                         primary_location_id,
                         'primary' as configuration,
@@ -644,51 +769,48 @@ def create_get_timeseries_char_query(tcq: TimeseriesCharQuery) -> str:
                         {gb_fields}
                      FROM
                          joined_timeseries sf
-                     {tqu.filters_to_sql(tcq.filters)}
-                     GROUP BY
+                     {tqu.filters_to_sql(tcq.filters, params)}
+                     ORDER BY
                         value_time,
                         primary_location_id,
-                        --configuration,
                         measurement_unit,
                         variable_name,
+                        reference_time
                     """
     else:
+        fts_fields = dict.fromkeys(
+            [*tcq.group_by, "secondary_value", "value_time"]
+        )
         fts_clause = f"""
                       SELECT
-                        *
+                        {", ".join(fts_fields)}
                       FROM
                           joined_timeseries sf
-                      {tqu.filters_to_sql(tcq.filters)}
+                      {tqu.filters_to_sql(tcq.filters, params)}
                       """
 
     query = f"""
         WITH fts AS (
             {fts_clause}
         ),
-        mxt AS (
-            SELECT
-                {",".join(tcq.group_by)}
-                , {tcq.timeseries_name}_value
-                , value_time
-                , ROW_NUMBER() OVER(
-                    PARTITION BY {",".join(tcq.group_by)}
-                    ORDER BY {tcq.timeseries_name}_value DESC, value_time
-                ) as n
-            FROM fts
-        ),
         chars AS (
             SELECT
-                {",".join(tcq.group_by)}
-                ,count(fts.{tcq.timeseries_name}_value) as count
-                ,min(fts.{tcq.timeseries_name}_value) as min
-                ,max(fts.{tcq.timeseries_name}_value) as max
-                ,avg(fts.{tcq.timeseries_name}_value) as average
-                ,sum(fts.{tcq.timeseries_name}_value) as sum
-                ,var_pop(fts.{tcq.timeseries_name}_value) as variance
+                {group_by}
+                ,count({ts_value}) as count
+                ,min({ts_value}) as min
+                ,max({ts_value}) as max
+                ,avg({ts_value}) as average
+                ,sum({ts_value}) as sum
+                ,var_pop({ts_value}) as variance
+                -- Time of the maximum value, the earliest if tied
+                ,arg_max(
+                    fts.value_time,
+                    {ts_value} ORDER BY fts.value_time
+                ) as max_value_time
             FROM
                 fts
             GROUP BY
-                {",".join(tcq.group_by)}
+                {group_by}
         )
         SELECT
             chars.{tcq.timeseries_name}_location_id as location_id,
@@ -698,11 +820,10 @@ def create_get_timeseries_char_query(tcq: TimeseriesCharQuery) -> str:
             chars.average,
             chars.sum,
             chars.variance,
-            mxt.value_time as max_value_time
+            chars.max_value_time
         FROM chars
-            {join_max_time_on}
         ORDER BY
-            {",".join(order_by)}
+            {order_by}
     ;"""
 
     return query
@@ -723,11 +844,12 @@ def create_unique_field_values_query(fn: JoinedTimeseriesFieldName) -> str:
     """
     query = f"""
         SELECT
-        DISTINCT
             {fn.field_name}
         AS unique_{fn.field_name}_values,
         FROM
             joined_timeseries
+        GROUP BY
+            {fn.field_name}
         ORDER BY
             {fn.field_name}
         """
@@ -5,7 +5,8 @@ import warnings
 
 from collections.abc import Iterable
 from datetime import datetime
-from typing import List, Union
+from enum import Enum
+from typing import Dict, List, Optional, Union
 
 import teehr.models.queries as tmq
 import teehr.models.queries_database as tmqd
@@ -53,7 +54,8 @@ def _format_iterable_value(
 
 
 def _format_filter_item(
-    filter: Union[tmq.JoinedFilter, tmq.TimeseriesFilter, tmqd.Filter]
+    filter: Union[tmq.JoinedFilter, tmq.TimeseriesFilter, tmqd.Filter],
+    params: Optional[List] = None
 ) -> str:
     r"""Return an SQL formatted string for single filter object.
 
@@ -61,6 +63,10 @@ def _format_filter_item(
     ----------
     filter : models.\\*Filter
         A single \\*Filter object.
+    params : Optional[List]
+        If provided, the filter value is appended to this list of query
+        parameters and replaced by a ``?`` placeholder, rather than
+        formatted into the string.
 
     Returns
     -------
@@ -78,6 +84,17 @@ def _format_filter_item(
     if column in prepend_sf_list:
         column = f"sf.{column}"
 
+    if params is not None:
+        if (
+            isinstance(filter.value, Iterable)
+            and not isinstance(filter.value, str)
+        ):
+            params.extend(filter.value)
+            placeholders = ", ".join(["?"] * len(filter.value))
+            return f"""{column} {filter.operator} ({placeholders})"""
+        params.append(filter.value)
+        return f"""{column} {filter.operator} ?"""
+
     if isinstance(filter.value, str):
         return f"""{column} {filter.operator} '{filter.value}'"""
     elif (
@@ -102,7 +119,8 @@ def _format_filter_item(
 
 
 def filters_to_sql(
-    filters: Union[List[tmq.JoinedFilter], List[tmqd.Filter]]
+    filters: Union[List[tmq.JoinedFilter], List[tmqd.Filter]],
+    params: Optional[List] = None
 ) -> List[str]:
     """Generate SQL where clause string from filters.
 
@@ -110,6 +128,9 @@ def filters_to_sql(
     ----------
     filters : Union[List[tmq.JoinedFilter], List[tmqd.Filter]]
         A list of Filter objects describing the filters.
+    params : Optional[List]
+        If provided, the filter values are appended to this list of query
+        parameters and replaced by ``?`` placeholders.
 
     Returns
     -------
@@ -119,13 +140,80 @@ def filters_to_sql(
     if len(filters) > 0:
         filter_strs = []
         for f in filters:
-            filter_strs.append(_format_filter_item(f))
+            filter_strs.append(_format_filter_item(f, params))
         qry = f"""WHERE {f" AND ".join(filter_strs)}"""
         return qry
 
     return "--no where clause"
 
 
+# Joined timeseries fields that can be filtered while reading each source
+#  file, mapped to the corresponding source column or expression. Only
+#  fields identifying a timeseries value, or derived from them (lead_time),
+#  are included, so that filtering the sources before removing duplicate
+#  primary values does not change which rows are kept.
+SECONDARY_PREFILTER_COLUMNS = {
+    "reference_time": "sf.reference_time",
+    "value_time": "sf.value_time",
+    "configuration": "sf.configuration",
+    "measurement_unit": "sf.measurement_unit",
+    "variable_name": "sf.variable_name",
+    "lead_time": "(sf.value_time - sf.reference_time)",
+}
+PRIMARY_PREFILTER_COLUMNS = {
+    "value_time": "pf.value_time",
+    "measurement_unit": "pf.measurement_unit",
+    "variable_name": "pf.variable_name",
+    "primary_location_id": "pf.location_id",
+}
+
+
+def source_filters_to_sql(
+    filters: List[tmqd.Filter],
+    columns: Dict[str, str]
+) -> str:
+    """Generate SQL where clause string from filters on a source file.
+
+    Parameters
+    ----------
+    filters : List[tmqd.Filter]
+        A list of Filter objects on joined timeseries fields.
+    columns : Dict[str, str]
+        Mapping of the joined timeseries fields that apply to the source
+        to the source column names.
+
+    Returns
+    -------
+    str
+        A where clause formatted string.
+    """
+    source_filters = [
+        f.model_copy(update={"column": columns[f.column]})
+        for f in filters if f.column in columns
+    ]
+    return filters_to_sql(source_filters)
+
+
+def joined_filters_to_sql(filters: List[tmqd.Filter]) -> str:
+    """Generate SQL where clause string from filters not applied to sources.
+
+    Parameters
+    ----------
+    filters : List[tmqd.Filter]
+        A list of Filter objects on joined timeseries fields.
+
+    Returns
+    -------
+    str
+        A where clause formatted string.
+    """
+    return filters_to_sql([
+        f for f in filters
+        if f.column not in SECONDARY_PREFILTER_COLUMNS
+        and f.column not in PRIMARY_PREFILTER_COLUMNS
+    ])
+
+
 def geometry_join_clause(
     q: Union[tmq.MetricQuery, tmq.JoinedTimeseriesQuery]
 ) -> str:
@@ -194,112 +282,105 @@ def metric_geometry_join_clause(
     return ""
 
 
+# Fields identifying a single timeseries value in the joined timeseries.
+TIMESERIES_VALUE_KEY_FIELDS = [
+    "reference_time",
+    "value_time",
+    "primary_location_id",
+    "configuration",
+    "variable_name",
+    "measurement_unit",
+]
+
+
+def _latest_primary_select(fields: List[str]) -> str:
+    """Generate a query keeping the latest primary value for each value.
+
+    Duplicate primary values (e.g., from overlapping primary reference
+    times) are removed by keeping the row with the latest
+    primary_reference_time for each timeseries value, using one hash
+    aggregation over the key fields rather than a windowed sort.
+    """
+    latest_fields = [f for f in fields if f not in TIMESERIES_VALUE_KEY_FIELDS]
+    struct_items = ", ".join([f"'{f}': {f}" for f in latest_fields])
+    select_fields = [
+        f if f in TIMESERIES_VALUE_KEY_FIELDS
+        else f"latest_row.{f} AS {f}"
+        for f in fields
+    ]
+    qry = f"""
+            SELECT
+                {", ".join(select_fields)}
+            FROM (
+                SELECT
+                    {", ".join(TIMESERIES_VALUE_KEY_FIELDS)}
+                    , arg_max(
+                        {{{struct_items}}},
+                        COALESCE(
+                            primary_reference_time, '-infinity'::TIMESTAMP
+                        )
+                    ) AS latest_row
+                FROM initial_joined
+                GROUP BY
+                    {", ".join(TIMESERIES_VALUE_KEY_FIELDS)}
+            )
+        """
+    return qry
+
+
 def _remove_duplicates_jtq_cte(
     q: tmq.JoinedTimeseriesQuery
 ) -> str:
     """Generate the remove duplicates CTE for the JoinedTimeseriesQuery."""
+    fields = [
+        "reference_time",
+        "value_time",
+        "secondary_location_id",
+        "secondary_value",
+        "configuration",
+        "measurement_unit",
+        "variable_name",
+        "primary_value",
+        "primary_location_id",
+        "lead_time",
+    ]
+    if q.include_geometry:
+        fields.append("geometry")
     if q.remove_duplicates:
-        qry = f"""
+        return _latest_primary_select(fields)
+    return f"""
             SELECT
-                reference_time
-                , value_time
-                , secondary_location_id
-                , secondary_value
-                , configuration
-                , measurement_unit
-                , variable_name
-                , primary_value
-                , primary_location_id
-                , lead_time
-                {geometry_joined_select_clause(q)}
-            FROM(
-                SELECT *,
-                    row_number()
-                OVER(
-                    PARTITION BY value_time,
-                                 primary_location_id,
-                                 configuration,
-                                 variable_name,
-                                 measurement_unit,
-                                 reference_time
-                    ORDER BY primary_reference_time desc
-                    ) AS rn
-                FROM initial_joined
-                )
-            WHERE rn = 1
-        """
-    else:
-        qry = f"""
-            SELECT
-                reference_time
-                , value_time
-                , secondary_location_id
-                , secondary_value
-                , configuration
-                , measurement_unit
-                , variable_name
-                , primary_value
-                , primary_location_id
-                , lead_time
-                {geometry_joined_select_clause(q)}
+                {", ".join(fields)}
             FROM
                 initial_joined
         """
-    return qry
 
 
 def _remove_duplicates_mq_cte(
     q: tmq.MetricQuery
 ) -> str:
     """Generate the remove duplicates CTE for the MetricQuery."""
+    fields = [
+        "reference_time",
+        "value_time",
+        "secondary_location_id",
+        "secondary_value",
+        "configuration",
+        "measurement_unit",
+        "variable_name",
+        "primary_value",
+        "primary_location_id",
+        "lead_time",
+        "absolute_difference",
+    ]
     if q.remove_duplicates:
-        qry = """
+        return _latest_primary_select(fields)
+    return f"""
             SELECT
-                reference_time
-                , value_time
-                , secondary_location_id
-                , secondary_value
-                , configuration
-                , measurement_unit
-                , variable_name
-                , primary_value
-                , primary_location_id
-                , lead_time
-                , absolute_difference
-            FROM(
-                SELECT *,
-                    row_number()
-                OVER(
-                    PARTITION BY value_time,
-                                 primary_location_id,
-                                 configuration,
-                                 variable_name,
-                                 measurement_unit,
-                                 reference_time
-                    ORDER BY primary_reference_time desc
-                    ) AS rn
-                FROM initial_joined
-                )
-            WHERE rn = 1
-        """
-    else:
-        qry = """
-            SELECT
-                reference_time
-                , value_time
-                , secondary_location_id
-                , secondary_value
-                , configuration
-                , measurement_unit
-                , variable_name
-                , primary_value
-                , primary_location_id
-                , lead_time
-                , absolute_difference
+                {", ".join(fields)}
             FROM
                 initial_joined
         """
-    return qry
 
 
 def _join_time_on(join: str, join_to: str, join_on: List[str]):
@@ -321,13 +402,74 @@ def _join_on(join: str, join_to: str, join_on: List[str]) -> str:
     return qry
 
 
+# Metrics that read the absolute_difference and value_time fields.
+ABSOLUTE_DIFFERENCE_METRICS = [
+    "mean_absolute_error",
+    "mean_squared_error",
+    "root_mean_squared_error",
+    "mean_absolute_relative_error",
+]
+VALUE_TIME_METRICS = [
+    "primary_max_value_time",
+    "secondary_max_value_time",
+    "max_value_timedelta",
+    "annual_peak_relative_bias",
+    "spearman_correlation",
+]
+
+
+def _included_metrics(
+    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
+) -> List[str]:
+    """Get the names of the metrics included in the query."""
+    if mq.include_metrics == "all":
+        return [item.value for item in tmq.MetricEnum]
+    if isinstance(mq.include_metrics, str):
+        return [mq.include_metrics]
+    # Use the enum values, since str() of a MetricEnum member is its
+    #  qualified name with the python < 3.11 StrEnum fallback.
+    return list(dict.fromkeys(
+        m.value if isinstance(m, Enum) else m for m in mq.include_metrics
+    ))
+
+
+def _includes_any_metric(
+    mq: Union[tmq.MetricQuery, tmqd.MetricQuery],
+    metrics: List[str]
+) -> bool:
+    """Check whether any of the metrics are included in the query."""
+    return not set(metrics).isdisjoint(_included_metrics(mq))
+
+
+def _select_joined_fields(mq: tmqd.MetricQuery) -> str:
+    """Generate the list of joined_timeseries fields used by the metrics."""
+    fields = [
+        *mq.group_by,
+        "primary_value",
+        "secondary_value",
+    ]
+    if _includes_any_metric(mq, ABSOLUTE_DIFFERENCE_METRICS):
+        fields.append("absolute_difference")
+    if _includes_any_metric(mq, VALUE_TIME_METRICS):
+        fields.append("value_time")
+    if _includes_any_metric(mq, ["spearman_correlation"]):
+        fields.extend([
+            "primary_location_id",
+            "secondary_location_id",
+            "configuration",
+            "measurement_unit",
+            "variable_name",
+            "reference_time",
+        ])
+    return ", ".join(dict.fromkeys(fields))
+
+
 def _nse_cte(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
     """Generate the nash-sutcliffe-efficiency CTE."""
-    if (
-        "nash_sutcliffe_efficiency" in mq.include_metrics
-        or "nash_sutcliffe_efficiency_normalized" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
+    if _includes_any_metric(mq, [
+        "nash_sutcliffe_efficiency",
+        "nash_sutcliffe_efficiency_normalized",
+    ]):
         return f"""
         ,nse AS (
             SELECT
@@ -366,11 +508,8 @@ def _nse_cte(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
 
 def _spearman_ranks_cte(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
     """Generate the spearman ranks CTE."""
-    if (
-        "spearman_correlation" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return f""", spearman_ranked AS (
+    if _includes_any_metric(mq, ["spearman_correlation"]):
+        return f""", spearman_ranked AS MATERIALIZED (
             SELECT
                 primary_location_id
                 , secondary_location_id
@@ -397,10 +536,7 @@ def _join_spearman_ranks_cte(
         mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
 ) -> str:
     """Generate the annual signature metrics CTE."""
-    if (
-        "spearman_correlation" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
+    if _includes_any_metric(mq, ["spearman_correlation"]):
         return f"""
             INNER JOIN spearman_ranked
                 ON joined.primary_location_id = spearman_ranked.primary_location_id
@@ -414,23 +550,9 @@ def _join_spearman_ranks_cte(
     return ""
 
 
-def _select_spearman_correlation(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
-    """Generate the select spearman correlation query segment."""
-    if (
-        "spearman_correlation" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """
-        , 1 - (6 * SUM(POWER(ABS(primary_rank - secondary_rank), 2))) / (POWER(COUNT(*), 3) - COUNT(*)) AS spearman_correlation"""
-    return ""
-
-
 def _annual_metrics_cte(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
     """Generate the annual signature metrics CTE."""
-    if (
-        "annual_peak_relative_bias" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
+    if _includes_any_metric(mq, ["annual_peak_relative_bias"]):
         return f"""
         , annual_aggs AS (
             SELECT
@@ -463,11 +585,10 @@ def _annual_metrics_cte(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
 
 def _join_nse_cte(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
     """Generate the join nash-sutcliffe-efficiency CTE."""
-    if (
-        "nash_sutcliffe_efficiency" in mq.include_metrics
-        or "nash_sutcliffe_efficiency_normalized" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
+    if _includes_any_metric(mq, [
+        "nash_sutcliffe_efficiency",
+        "nash_sutcliffe_efficiency_normalized",
+    ]):
         return f"""
             {_join_on(join="nse", join_to="joined", join_on=mq.group_by)}
         """
@@ -478,10 +599,7 @@ def _join_annual_metrics_cte(
         mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
 ) -> str:
     """Generate the annual signature metrics CTE."""
-    if (
-        "annual_peak_relative_bias" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
+    if _includes_any_metric(mq, ["annual_peak_relative_bias"]):
         return f"""
             {_join_on(join="annual_metrics", join_to="metrics", join_on=mq.group_by)}
         """
@@ -500,381 +618,116 @@ def _join_annual_metrics_cte(
 #     return ""
 
 
-def _select_max_value_timedelta(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select max value timedelta query segment."""
-    if (
-        "max_value_timedelta" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, arg_max(
-                joined.value_time,
-                secondary_value ORDER BY joined.value_time ASC
-            )
-        - arg_max(
-            joined.value_time,
-            primary_value ORDER BY joined.value_time ASC
-            ) as max_value_timedelta"""
-    return ""
-
-
-def _select_secondary_max_value_time(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select secondary max value time query segment."""
-    if (
-        "secondary_max_value_time" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, arg_max(
-            joined.value_time,
-            secondary_value ORDER BY joined.value_time ASC
-        ) as secondary_max_value_time"""
-    return ""
-
-
-def _select_primary_max_value_time(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select primary max value time query segment."""
-    if (
-        "primary_max_value_time" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, arg_max(
-            joined.value_time,
-            primary_value ORDER BY joined.value_time ASC
-            ) as primary_max_value_time"""
-    return ""
-
-
-def _select_root_mean_squared_error(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select root mean squared error query segment."""
-    if (
-        "root_mean_squared_error" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, sqrt(sum(power(absolute_difference, 2))/count(*))
-            as root_mean_squared_error
-        """
-    return ""
-
-
-def _select_mean_squared_error(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select mean squared error query segment."""
-    if (
-        "mean_squared_error" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, sum(power(absolute_difference, 2))/count(*)
-            as mean_squared_error
-        """
-    return ""
-
-
-def _select_mean_absolute_error(
-        mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select mean absolute error query segment."""
-    if (
-        "mean_absolute_error" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, sum(absolute_difference)/count(*) as mean_absolute_error"""
-    return ""
-
-
-def _select_mean_absolute_relative_error(
-        mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select mean absolute relative error query segment."""
-    if (
-        "mean_absolute_relative_error" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, sum(absolute_difference)/sum(primary_value) as mean_absolute_relative_error""" # noqa E501
-    return ""
-
-
-def _select_kling_gupta_efficiency(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select kling gupta efficiency query segment."""
-    if (
-        "kling_gupta_efficiency" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, 1 - sqrt(
+# Select clause fragment of the metrics CTE for each metric.  Metrics
+# calculated in their own CTE (annual_peak_relative_bias) have no entry.
+METRIC_SELECT_CLAUSES = {
+    "primary_count": ", count(primary_value) as primary_count",
+    "secondary_count": ", count(secondary_value) as secondary_count",
+    "primary_minimum": ", min(primary_value) as primary_minimum",
+    "secondary_minimum": ", min(secondary_value) as secondary_minimum",
+    "primary_maximum": ", max(primary_value) as primary_maximum",
+    "secondary_maximum": ", max(secondary_value) as secondary_maximum",
+    "primary_average": ", avg(primary_value) as primary_average",
+    "secondary_average": ", avg(secondary_value) as secondary_average",
+    "primary_sum": ", sum(primary_value) as primary_sum",
+    "secondary_sum": ", sum(secondary_value) as secondary_sum",
+    "primary_variance": ", var_pop(primary_value) as primary_variance",
+    "secondary_variance": ", var_pop(secondary_value) as secondary_variance",
+    "max_value_delta": """, max(secondary_value) - max(primary_value)
+            as max_value_delta
+        """,
+    "mean_error": """, sum(secondary_value - primary_value)/count(*)
+            as mean_error
+        """,
+    "nash_sutcliffe_efficiency": """, 1 - (
+            sum(pow(joined.primary_value - joined.secondary_value, 2))
+            / sum(pow(joined.primary_value - nse.avg_primary_value, 2))
+        ) as nash_sutcliffe_efficiency
+        """,
+    "nash_sutcliffe_efficiency_normalized": """, 1/(2-(1 - (
+            sum(pow(joined.primary_value - joined.secondary_value, 2))
+            / sum(pow(joined.primary_value - nse.avg_primary_value, 2))
+        ))) as nash_sutcliffe_efficiency_normalized
+        """,
+    # ToDo: Need to fix log of zero issue for nash_sutcliffe_efficiency_log.
+    "kling_gupta_efficiency": """, 1 - sqrt(
             pow(corr(secondary_value, primary_value) - 1, 2)
             + pow(stddev(secondary_value) / stddev(primary_value) - 1, 2)
             + pow(avg(secondary_value) / avg(primary_value) - 1, 2)
         ) as kling_gupta_efficiency
-        """
-    return ""
-
-
-def _select_kling_gupta_efficiency_mod1(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select kling gupta efficiency mod1 query segment."""
-    if (
-        "kling_gupta_efficiency_mod1" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, 1 - sqrt(
+        """,
+    "kling_gupta_efficiency_mod1": """, 1 - sqrt(
             pow(corr(secondary_value, primary_value) - 1, 2)
-            + pow((stddev_pop(secondary_value) / avg(secondary_value)) / (stddev_pop(primary_value) / avg(primary_value)) - 1, 2)
+            + pow(
+                (stddev_pop(secondary_value) / avg(secondary_value))
+                / (stddev_pop(primary_value) / avg(primary_value)) - 1, 2
+            )
             + pow(avg(secondary_value) / avg(primary_value) - 1, 2)
         ) as kling_gupta_efficiency_mod1
-        """
-    return ""
-
-
-def _select_kling_gupta_efficiency_mod2(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select kling gupta efficiency mod2 query segment."""
-    if (
-        "kling_gupta_efficiency_mod2" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, 1 - sqrt(
+        """,
+    "kling_gupta_efficiency_mod2": """, 1 - sqrt(
             pow(corr(secondary_value, primary_value) - 1, 2)
             + pow(stddev_pop(secondary_value)
                 / stddev_pop(primary_value) - 1, 2)
             + pow(avg(secondary_value) - avg(primary_value), 2)
                 / pow(stddev_pop(primary_value), 2)
         ) as kling_gupta_efficiency_mod2
-        """
-    return ""
-
-
-def _select_nash_sutcliffe_efficiency(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select nash sutcliffe efficiency query segment."""
-    if (
-        "nash_sutcliffe_efficiency" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, 1 - (
-            sum(pow(joined.primary_value - joined.secondary_value, 2))
-            / sum(pow(joined.primary_value - nse.avg_primary_value, 2))
-        ) as nash_sutcliffe_efficiency
-        """
-    return ""
-
-
-def _select_nash_sutcliffe_efficiency_normalized(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select nash sutcliffe efficiency query segment."""
-    if (
-        "nash_sutcliffe_efficiency_normalized" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, 1/(2-(1 - (
-            sum(pow(joined.primary_value - joined.secondary_value, 2))
-            / sum(pow(joined.primary_value - nse.avg_primary_value, 2))
-        ))) as nash_sutcliffe_efficiency_normalized
-        """
-    return ""
-
-
-# def _select_nash_sutcliffe_efficiency_log(
-#     mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-# ) -> str:
-#     """Generate the select nash sutcliffe efficiency log query segment.
-
-#     ToDo: Need to fix log of zero issue here.
-#     """
-#     if (
-#         "nash_sutcliffe_efficiency_log" in mq.include_metrics
-#         or mq.include_metrics == "all"
-#     ):
-#         return """, 1 - (
-#             sum(pow(ln(joined.primary_value)
-#             - ln(joined.secondary_value), 2))
-#             / sum(pow(ln(joined.primary_value)
-#             - nse_log.avg_log_primary_value, 2))
-#         ) as nash_sutcliffe_efficiency_log
-#         """
-#     return ""
-
-
-def _select_mean_error(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
-    """Generate the select mean_error query segment."""
-    if "mean_error" in mq.include_metrics or mq.include_metrics == "all":
-        return """, sum(secondary_value - primary_value)/count(*) as mean_error""" # noqa E501
-    return ""
-
-
-def _select_relative_bias(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
-    """Generate the select relative bias query segment."""
-    if "relative_bias" in mq.include_metrics or mq.include_metrics == "all":
-        return ", sum(secondary_value - primary_value) / sum(primary_value) AS relative_bias" # noqa E501
-    return ""
-
-
-def _select_multiplicative_bias(
-        mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select multiplicative bias query segment."""
-    if (
-        "multiplicative_bias" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return ", mean(secondary_value) / mean(primary_value) AS multiplicative_bias" # noqa E501
-    return ""
-
-
-def _select_pearson_correlation(
-        mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select pearson correlation query segment."""
-    if (
-        "pearson_correlation" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return ", corr(secondary_value, primary_value) AS pearson_correlation"
-    return ""
-
-
-def _select_r_squared(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
-    """Generate the select r squared query segment."""
-    if "r_squared" in mq.include_metrics or mq.include_metrics == "all":
-        return """, pow(corr(secondary_value, primary_value), 2) as r_squared""" # noqa E501
-    return ""
-
-
-def _select_max_value_delta(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select max value delta query segment."""
-    if "max_value_delta" in mq.include_metrics or mq.include_metrics == "all":
-        return """, max(secondary_value) - max(primary_value)
-            as max_value_delta
-        """
-    return ""
-
-
-def _select_primary_count(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
-    """Generate the select primary count query segment."""
-    if "primary_count" in mq.include_metrics or mq.include_metrics == "all":
-        return """, count(primary_value) as primary_count"""
-    return ""
-
-
-def _select_secondary_count(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select secondary count query segment."""
-    if "secondary_count" in mq.include_metrics or mq.include_metrics == "all":
-        return """, count(secondary_value) as secondary_count"""
-    return ""
-
-
-def _select_primary_minimum(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select primary minimum query segment."""
-    if "primary_minimum" in mq.include_metrics or mq.include_metrics == "all":
-        return """, min(primary_value) as primary_minimum"""
-    return ""
-
-
-def _select_secondary_minimum(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select secondary minimum query segment."""
-    if (
-        "secondary_minimum" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, min(secondary_value) as secondary_minimum"""
-    return ""
-
-
-def _select_primary_maximum(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select primary maximum query segment."""
-    if "primary_maximum" in mq.include_metrics or mq.include_metrics == "all":
-        return """, max(primary_value) as primary_maximum"""
-    return ""
-
-
-def _select_secondary_maximum(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select secondary maximum query segment."""
-    if (
-        "secondary_maximum" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, max(secondary_value) as secondary_maximum"""
-    return ""
-
-
-def _select_primary_average(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select primary average query segment."""
-    if "primary_average" in mq.include_metrics or mq.include_metrics == "all":
-        return """, avg(primary_value) as primary_average"""
-    return ""
-
-
-def _select_secondary_average(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select secondary average query segment."""
-    if (
-        "secondary_average" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, avg(secondary_value) as secondary_average"""
-    return ""
-
-
-def _select_primary_sum(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
-    """Generate the select primary sum query segment."""
-    if "primary_sum" in mq.include_metrics or mq.include_metrics == "all":
-        return """, sum(primary_value) as primary_sum"""
-    return ""
-
-
-def _select_secondary_sum(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
-    """Generate the select secondary sum query segment."""
-    if "secondary_sum" in mq.include_metrics or mq.include_metrics == "all":
-        return """, sum(secondary_value) as secondary_sum"""
-    return ""
-
-
-def _select_primary_variance(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select primary variance query segment."""
-    if "primary_variance" in mq.include_metrics or mq.include_metrics == "all":
-        return """, var_pop(primary_value) as primary_variance"""
-    return ""
-
-
-def _select_secondary_variance(
-    mq: Union[tmq.MetricQuery, tmqd.MetricQuery]
-) -> str:
-    """Generate the select secondary variance query segment."""
-    if (
-        "secondary_variance" in mq.include_metrics
-        or mq.include_metrics == "all"
-    ):
-        return """, var_pop(secondary_value) as secondary_variance"""
-    return ""
+        """,
+    "mean_absolute_error": """, sum(absolute_difference)/count(*)
+            as mean_absolute_error
+        """,
+    "mean_squared_error": """, sum(power(absolute_difference, 2))/count(*)
+            as mean_squared_error
+        """,
+    "root_mean_squared_error": """, sqrt(
+            sum(power(absolute_difference, 2))/count(*)
+        ) as root_mean_squared_error
+        """,
+    "primary_max_value_time": """, arg_max(
+            joined.value_time,
+            primary_value ORDER BY joined.value_time ASC
+            ) as primary_max_value_time""",
+    "secondary_max_value_time": """, arg_max(
+            joined.value_time,
+            secondary_value ORDER BY joined.value_time ASC
+        ) as secondary_max_value_time""",
+    "max_value_timedelta": """, arg_max(
+                joined.value_time,
+                secondary_value ORDER BY joined.value_time ASC
+            )
+        - arg_max(
+            joined.value_time,
+            primary_value ORDER BY joined.value_time ASC
+            ) as max_value_timedelta""",
+    "relative_bias": """, sum(secondary_value - primary_value)
+            / sum(primary_value) AS relative_bias
+        """,
+    "multiplicative_bias": """, mean(secondary_value) / mean(primary_value)
+            AS multiplicative_bias
+        """,
+    "mean_absolute_relative_error": """, sum(absolute_difference)
+            / sum(primary_value) as mean_absolute_relative_error
+        """,
+    "pearson_correlation": """, corr(secondary_value, primary_value)
+            AS pearson_correlation
+        """,
+    "r_squared": """, pow(corr(secondary_value, primary_value), 2)
+            as r_squared
+        """,
+    "spearman_correlation": """, 1 - (
+            6 * SUM(POWER(ABS(primary_rank - secondary_rank), 2))
+        ) / (POWER(COUNT(*), 3) - COUNT(*)) AS spearman_correlation
+        """,
+}
+
+
+def _select_metrics(mq: Union[tmq.MetricQuery, tmqd.MetricQuery]) -> str:
+    """Generate the select clause of the metrics CTE."""
+    return "\n".join(
+        METRIC_SELECT_CLAUSES[metric]
+        for metric in _included_metrics(mq)
+        if metric in METRIC_SELECT_CLAUSES
+    )
 
 
 def df_to_gdf(df: pd.DataFrame) -> gpd.GeoDataFrame:
@@ -139,6 +139,28 @@ def test_in_filter_datetime():
     assert filter_str == "sf.reference_time in ('2023-04-01 23:30:00','2023-04-02 23:30:00')"  # noqa
 
 
+def test_filters_to_sql_params():
+    """Test filters formatted with query parameters."""
+    filters = [
+        tmq.JoinedFilter(
+            column="secondary_location_id",
+            operator="in",
+            value=["123456", "9876543"]
+        ),
+        tmq.JoinedFilter(
+            column="reference_time",
+            operator="=",
+            value=datetime(2023, 1, 1, 0, 0, 0)
+        ),
+    ]
+    params = []
+    filter_str = tqu.filters_to_sql(filters, params)
+    assert filter_str == (
+        "WHERE secondary_location_id in (?, ?) AND sf.reference_time = ?"
+    )
+    assert params == ["123456", "9876543", datetime(2023, 1, 1, 0, 0, 0)]
+
+
 if __name__ == "__main__":
     test_filter_string()
     test_filter_int()
@@ -152,4 +174,5 @@ if __name__ == "__main__":
     test_in_filter_int()
     test_in_filter_float()
     test_in_filter_datetime()
+    test_filters_to_sql_params()
     pass
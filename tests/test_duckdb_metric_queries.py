@@ -4,6 +4,7 @@ import geopandas as gpd
 import pytest
 from pydantic import ValidationError
 import teehr.queries.duckdb as tqu
+from teehr.models.queries import MetricEnum
 from pathlib import Path
 
 TEST_STUDY_DIR = Path("tests", "data", "test_study")
@@ -165,6 +166,32 @@ def test_metric_query_df_2():
     assert isinstance(query_df, pd.DataFrame)
 
 
+def test_metric_query_df_metric_enum():
+    """Test metric query with MetricEnum members as the metrics."""
+    include_metrics = [
+        MetricEnum.primary_count,
+        MetricEnum.mean_absolute_error,
+        MetricEnum.nash_sutcliffe_efficiency,
+        MetricEnum.primary_max_value_time,
+    ]
+    group_by = ["primary_location_id"]
+    query_df = tqu.get_metrics(
+        primary_filepath=PRIMARY_FILEPATH_DUPS,
+        secondary_filepath=SECONDARY_FILEPATH,
+        crosswalk_filepath=CROSSWALK_FILEPATH,
+        group_by=group_by,
+        order_by=["primary_location_id"],
+        include_metrics=include_metrics,
+        return_query=False,
+        include_geometry=False,
+        remove_duplicates=True,
+    )
+    assert len(query_df) == 3
+    assert query_df.columns.tolist() == group_by + [
+        m.value for m in include_metrics
+    ]
+
+
 def test_metric_query_df_time_metrics():
     """Test metric query with time metrics."""
     include_metrics = [
@@ -281,6 +308,7 @@ if __name__ == "__main__":
     test_metric_query_gdf_no_geom()
     test_metric_query_gdf_missing_group_by()
     test_metric_query_df_2()
+    test_metric_query_df_metric_enum()
     test_metric_query_df_time_metrics()
     test_metric_query_df_all()
     test_metric_query_value_time_filter()
@@ -1,5 +1,8 @@
 """Test NWM30 configuration models."""
-from teehr.models.loading.nwm30_grid import GridConfigurationModel
+from teehr.models.loading.nwm30_grid import (
+    GridConfigurationModel,
+    validate_grid
+)
 from teehr.models.loading.nwm30_point import PointConfigurationModel
 
 
@@ -58,7 +61,25 @@ def test_grid_model():
     assert var_name == "RAINRATE"
 
 
+def test_validate_grid():
+    """Test grid validation by configuration."""
+    forecast_obj = validate_grid(
+        "forcing_short_range_alaska",
+        {
+            "output_type": "forcing",
+            "forcing": "RAINRATE",
+        }
+    )
+
+    out_type = forecast_obj.output_type.name
+    var_name = getattr(forecast_obj, out_type).name
+
+    assert out_type == "forcing"
+    assert var_name == "RAINRATE"
+
+
 if __name__ == "__main__":
     test_point_model()
     test_grid_model()
+    test_validate_grid()
     pass
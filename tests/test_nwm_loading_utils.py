@@ -1,6 +1,9 @@
 """Test NWM loading utils."""
+from datetime import datetime
 from pathlib import Path
 
+import fsspec
+import numpy as np
 import pytest
 
 from teehr.loading.nwm.utils import (
@@ -11,6 +14,13 @@ from teehr.loading.nwm.utils import (
     get_dataset,
     create_periods_based_on_chunksize
 )
+from teehr.loading.nwm.point_utils import (
+    build_point_batch,
+    fetch_and_format_nwm_points,
+    fetch_reference_jsons,
+    get_point_schema,
+    location_id_dictionary_array,
+)
 from teehr.loading.nwm.const import (
     NWM22_ANALYSIS_CONFIG,
     NWM30_ANALYSIS_CONFIG,
@@ -217,6 +227,112 @@ def test_create_periods_based_on_year():
     assert periods[0].end_time.strftime(TIMEFORMAT) == "2023-12-31 23:59:59"
 
 
+def test_build_point_batch():
+    """Test assembling a record batch of formatted point values."""
+    feature_ids = np.array([101, 2020, 30303], dtype=np.int32)
+    batch = build_point_batch(
+        vals=np.array([1.5, 2.5, 3.5], dtype=np.float32),
+        ref_time=np.datetime64("2023-11-01T00:00"),
+        valid_time=np.array(["2023-11-01T01:00"], dtype="datetime64[ns]"),
+        location_ids=location_id_dictionary_array(
+            "nwm30", feature_ids.tobytes()
+        ),
+        configuration="short_range",
+        variable_name="streamflow",
+        measurement_unit="m3/s",
+        schema=get_point_schema(),
+    )
+    assert batch.schema == get_point_schema()
+    columns = {
+        name: batch.column(name).to_pylist() for name in batch.schema.names
+    }
+    assert columns["value"] == [1.5, 2.5, 3.5]
+    assert columns["location_id"] == [
+        "nwm30-101", "nwm30-2020", "nwm30-30303"
+    ]
+    assert columns["reference_time"] == [datetime(2023, 11, 1, 0)] * 3
+    assert columns["value_time"] == [datetime(2023, 11, 1, 1)] * 3
+    assert columns["configuration"] == ["short_range"] * 3
+    assert columns["variable_name"] == ["streamflow"] * 3
+    assert columns["measurement_unit"] == ["m3/s"] * 3
+
+
+def test_fetch_reference_jsons_mixed_protocols():
+    """Test fetching a batch that mixes local and remote jsons."""
+    # The in-memory filesystem stands in for a remote store
+    remote_fs = fsspec.filesystem("memory")
+    remote_paths = [
+        "memory://nwm-test/nwm.20231101/short_range.f001.json",
+        "memory://nwm-test/nwm.20231101/short_range.f002.json",
+    ]
+    for i, path in enumerate(remote_paths):
+        remote_fs.pipe(path, f"remote-{i}".encode())
+
+    TEMP_DIR.mkdir(parents=True, exist_ok=True)
+    local_paths = [
+        str(Path(TEMP_DIR, "short_range.f003.json")),
+        str(Path(TEMP_DIR, "short_range.f004.json")),
+    ]
+    for i, path in enumerate(local_paths):
+        Path(path).write_bytes(f"local-{i}".encode())
+
+    missing_path = "memory://nwm-test/nwm.20231101/short_range.f005.json"
+    filepaths = [
+        local_paths[0],
+        remote_paths[0],
+        local_paths[1],
+        remote_paths[1],
+        missing_path,
+    ]
+
+    references = fetch_reference_jsons(filepaths, ignore_missing_file=True)
+    assert references == {
+        local_paths[0]: b"local-0",
+        remote_paths[0]: b"remote-0",
+        local_paths[1]: b"local-1",
+        remote_paths[1]: b"remote-1",
+    }
+
+    # The remote paths are also read correctly when listed first
+    references = fetch_reference_jsons(
+        filepaths[1:4], ignore_missing_file=False
+    )
+    assert references == {
+        remote_paths[0]: b"remote-0",
+        local_paths[1]: b"local-1",
+        remote_paths[1]: b"remote-1",
+    }
+
+    with pytest.raises(FileNotFoundError):
+        fetch_reference_jsons(filepaths, ignore_missing_file=False)
+
+    remote_fs.rm("memory://nwm-test", recursive=True)
+    for path in local_paths:
+        Path(path).unlink()
+
+
+def test_fetch_and_format_nwm_points_no_files():
+    """Test formatting NWM points when there are no reference files."""
+    kwargs = {
+        "json_paths": [],
+        "location_ids": [7086109],
+        "configuration": "short_range",
+        "variable_name": "streamflow",
+        "output_parquet_dir": Path(TEMP_DIR, "no_files"),
+        "stepsize": 100,
+        "ignore_missing_file": True,
+        "units_format_dict": {},
+        "overwrite_output": True,
+        "nwm_version": "nwm30",
+    }
+    # No z-hour groups are formed, so nothing is written
+    fetch_and_format_nwm_points(process_by_z_hour=True, **kwargs)
+    assert not any(Path(TEMP_DIR, "no_files").iterdir())
+
+    with pytest.raises(FileNotFoundError):
+        fetch_and_format_nwm_points(process_by_z_hour=False, **kwargs)
+
+
 if __name__ == "__main__":
     test_dates_and_nwm_version()
     test_building_nwm30_gcs_paths()
@@ -228,3 +344,6 @@ if __name__ == "__main__":
     test_create_periods_based_on_week()
     test_create_periods_based_on_month()
     test_create_periods_based_on_year()
+    test_build_point_batch()
+    test_fetch_reference_jsons_mixed_protocols()
+    test_fetch_and_format_nwm_points_no_files()
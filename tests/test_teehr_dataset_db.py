@@ -3,6 +3,7 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 import geopandas as gpd
+import pytest
 
 from teehr.database.teehr_dataset import TEEHRDatasetDB
 
@@ -41,6 +42,62 @@ def test_insert_joined_timeseries():
     pass
 
 
+def test_insert_joined_timeseries_filters():
+    """Test the insert joined timeseries query with filters."""
+    if DATABASE_FILEPATH.is_file():
+        DATABASE_FILEPATH.unlink()
+
+    tds = TEEHRDatasetDB(DATABASE_FILEPATH)
+
+    # Perform the filtered join and insert into duckdb database
+    tds.insert_joined_timeseries(
+        primary_filepath=PRIMARY_FILEPATH,
+        secondary_filepath=SECONDARY_FILEPATH,
+        crosswalk_filepath=CROSSWALK_FILEPATH,
+        drop_added_fields=True,
+        filters=[
+            {
+                "column": "primary_location_id",
+                "operator": "=",
+                "value": "gage-A"
+            },
+            {
+                "column": "lead_time",
+                "operator": "<=",
+                "value": "10 hours"
+            },
+        ]
+    )
+
+    df = tds.query("SELECT * FROM joined_timeseries", format="df")
+    assert df.primary_location_id.unique().tolist() == ["gage-A"]
+    assert (df.lead_time <= pd.Timedelta("10 hours")).all()
+    pass
+
+
+def test_insert_joined_timeseries_geometry_filter():
+    """Test that a geometry filter is rejected on insert."""
+    if DATABASE_FILEPATH.is_file():
+        DATABASE_FILEPATH.unlink()
+
+    tds = TEEHRDatasetDB(DATABASE_FILEPATH)
+
+    with pytest.raises(ValueError):
+        tds.insert_joined_timeseries(
+            primary_filepath=PRIMARY_FILEPATH,
+            secondary_filepath=SECONDARY_FILEPATH,
+            crosswalk_filepath=CROSSWALK_FILEPATH,
+            drop_added_fields=True,
+            filters=[
+                {
+                    "column": "geometry",
+                    "operator": "=",
+                    "value": "POINT (0 0)"
+                },
+            ]
+        )
+
+
 def test_unique_field_values():
     """Test the unique field values query."""
     if DATABASE_FILEPATH.is_file():
@@ -427,6 +484,8 @@ def test_timeseries_char_query():
 if __name__ == "__main__":
 
     test_insert_joined_timeseries()
+    test_insert_joined_timeseries_filters()
+    test_insert_joined_timeseries_geometry_filter()
     test_unique_field_values()
     test_metrics_query()
     test_metrics_query_config_filter()